@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 from config import Config
 from models import db
@@ -8,6 +8,13 @@ from routes.admin import admin_bp
 from routes.feedback import feedback_bp
 from routes.profile import profile_bp
 from routes.recognition import recognition_bp
+from services.batching import init_scheduler
+from services.result_cache import init_result_cache
+from services.phash import init_near_duplicate_index
+from services.upload_store import init_upload_store
+from services.knowledge import init_knowledge_store
+from services.stats_cache import init_stats_cache
+from services.warmup import check_ready, warmup
 import os
 
 # 获取项目根目录
@@ -24,7 +31,7 @@ CORS(app, origins=[
     'http://localhost:3000',
     'http://localhost:3001',
     'http://101.42.36.143'
-], supports_credentials=True)
+], supports_credentials=True, expose_headers=['X-Next-Cursor'])
 
 # 初始化数据库
 db.init_app(app)
@@ -37,6 +44,15 @@ app.register_blueprint(feedback_bp, url_prefix='/api')
 app.register_blueprint(profile_bp, url_prefix='/api')
 app.register_blueprint(recognition_bp, url_prefix='/api')
 
+init_scheduler(app)
+init_result_cache(app)
+init_near_duplicate_index(app)
+init_upload_store(app)
+init_knowledge_store(app)
+init_stats_cache(app)
+
+# 预热在 gunicorn 的 post_worker_init 钩子中执行（gunicorn.conf.py），脚本导入 app 时不会加载模型
+
 
 @app.route('/')
 def index():
@@ -47,12 +63,14 @@ def index():
         'status': 'running',
         'endpoints': {
             'health': '/api/health',
+            'ready': '/api/ready',
             'auth': '/api/auth/*',
             'knowledge': '/api/knowledge',
             'admin': '/api/admin/*',
             'feedback': '/api/feedback',
             'history': '/api/history',
             'recognize': '/api/recognize',
+            'recognizeBatch': '/api/recognize/batch',
             'recognitions': '/api/recognitions/:id',
             'profile': '/api/profile'
         }
@@ -61,10 +79,20 @@ def index():
 
 @app.route('/api/health', methods=['GET'])
 def health():
-    """健康检查"""
+    """健康检查；?ready=1 时等同于 /api/ready"""
+    if request.args.get('ready') in ('1', 'true'):
+        return ready()
     return jsonify({'ok': True, 'service': 'airicepest-backend'})
 
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """就绪检查：预热完成前返回 503，附带启动耗时和各步骤耗时"""
+    status = check_ready(app).status()
+    body = {'ok': status['ready'], 'service': 'airicepest-backend', **status}
+    return jsonify(body), 200 if status['ready'] else 503
+
+
 @app.route('/favicon.ico')
 def favicon():
     """Favicon 处理"""
@@ -90,6 +118,7 @@ if __name__ == '__main__':
     with app.app_context():
         # 创建所有表（如果不存在）
         db.create_all()
+    warmup(app)
     
     # 以 4000 端口启动以便与前端默认配置（http://localhost:4000）一致
     app.run(host='0.0.0.0', port=4000, debug=False)
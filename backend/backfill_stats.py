@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+回填识别量日汇总表（history_daily_stats）
+
+首次部署汇总表、新增 STATS_TIMEZONES 中的时区，或直接改动过 history 表后运行。
+每个时区在一个事务内先删后插，可重复执行。
+
+用法:
+    python backfill_stats.py                          # STATS_TIMEZONES 中的全部时区，全量重建
+    python backfill_stats.py --since 2024-06-01       # 只重建该日（本地日期）及之后
+    python backfill_stats.py --timezone Asia/Shanghai
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import date
+
+from app import app
+from models import db
+from services.stats_rollup import backfill, stats_timezones
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild history_daily_stats from the history table.")
+    parser.add_argument(
+        "--timezone",
+        action="append",
+        help="Timezone to rebuild; repeatable (default: every timezone in STATS_TIMEZONES)",
+    )
+    parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        help="Only rebuild this local date (YYYY-MM-DD) and later (default: everything)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="History rows fetched per round trip (default: 10000)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    with app.app_context():
+        for tz_name in args.timezone or stats_timezones():
+            started = time.perf_counter()
+            try:
+                rows = backfill(tz_name, args.since, args.batch_size)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            print(f"✅ {tz_name}: {rows} history rows rolled up in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+基准测试：管理后台用户列表（GET /api/admin/users）
+
+生成合成用户、识别记录和反馈，对比改造前逐用户 COUNT（2N+1 条查询）与
+读取 users 计数器列的耗时和语句数，并测量 reconcile_counters() 全量核对的耗时。
+默认使用临时 SQLite 文件，不会改动业务库。
+
+用法:
+    python benchmark_admin_users.py                       # 10 万用户
+    python benchmark_admin_users.py --users 20000 --legacy-users 2000
+    python benchmark_admin_users.py --database-url mysql+pymysql://...   # 须为空库
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from flask import Flask
+from sqlalchemy import event, insert, update
+
+from models import db, Feedback, History, User
+from routes.admin import admin_bp, serialize_basic_user
+from services.user_stats import reconcile_counters
+from utils import generate_token
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark GET /api/admin/users against the per-user COUNT version.")
+    parser.add_argument("--users", type=int, default=100000, help="Synthetic users (default: 100000)")
+    parser.add_argument("--histories", type=int, default=3, help="Average history rows per user (default: 3)")
+    parser.add_argument("--feedbacks", type=float, default=0.2, help="Average feedbacks per user (default: 0.2)")
+    parser.add_argument(
+        "--legacy-users",
+        type=int,
+        default=5000,
+        help="Users timed with the old per-user COUNT loop, projected to --users (0 to skip; default: 5000)",
+    )
+    parser.add_argument("--database-url", help="Empty database to seed (default: temporary SQLite file)")
+    return parser.parse_args()
+
+
+def create_app(database_url: str) -> Flask:
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SECRET_KEY='benchmark',
+    )
+    db.init_app(app)
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    return app
+
+
+def seed(args: argparse.Namespace):
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    users = [
+        {
+            'username': f'farmer{i:06d}',
+            'email': f'farmer{i:06d}@example.com',
+            'role': 'admin' if i % 1000 == 0 else 'user',
+            'is_active': rng.random() > 0.1,
+            'created_at': now - timedelta(days=rng.randrange(720)),
+            'last_login': now - timedelta(days=rng.randrange(120)) if rng.random() > 0.3 else None,
+        }
+        for i in range(args.users)
+    ]
+    db.session.execute(insert(User), users)
+    histories = [
+        {
+            'id': f'b{i:08d}',
+            'user_id': rng.randrange(args.users) + 1,
+            'date': date.today(),
+            'disease_name': rng.choice(['稻瘟病', '纹枯病', '稻曲病']),
+            'confidence': 90,
+        }
+        for i in range(int(args.users * args.histories))
+    ]
+    for start in range(0, len(histories), 50000):
+        db.session.execute(insert(History), histories[start:start + 50000])
+    feedbacks = [
+        {'user_id': rng.randrange(args.users) + 1, 'text': 'benchmark', 'status': 'new'}
+        for _ in range(int(args.users * args.feedbacks))
+    ]
+    db.session.execute(insert(Feedback), feedbacks)
+    recognitions = Counter(row['user_id'] for row in histories)
+    feedback_counts = Counter(row['user_id'] for row in feedbacks)
+    db.session.execute(update(User), [
+        {'id': user_id, 'recognition_count': recognitions[user_id], 'feedback_count': feedback_counts[user_id]}
+        for user_id in range(1, args.users + 1)
+    ])
+    db.session.commit()
+    return len(histories), len(feedbacks)
+
+
+def legacy_users(limit: int) -> list[dict]:
+    """改造前 get_users 的写法：逐用户两条 COUNT"""
+    result = []
+    for user in User.query.order_by(User.id).limit(limit).all():
+        serialized = serialize_basic_user(user)
+        serialized.update({
+            'recognitionCount': History.query.filter_by(user_id=user.id).count(),
+            'feedbackCount': Feedback.query.filter_by(user_id=user.id).count(),
+        })
+        result.append(serialized)
+    return result
+
+
+def measure(fn):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    started = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+    return result, time.perf_counter() - started, len(statements)
+
+
+def main() -> None:
+    args = parse_args()
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite')
+    app = create_app(database_url)
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        histories, feedbacks = seed(args)
+        print(f"seeded {args.users} users, {histories} history rows, {feedbacks} feedbacks "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        if args.legacy_users:
+            sample = min(args.legacy_users, args.users)
+            _, elapsed, statements = measure(lambda: legacy_users(sample))
+            projected = elapsed * args.users / sample
+            print(f"legacy   {sample} users: {elapsed:.2f}s, {statements} statements "
+                  f"(projected {projected:.1f}s, {2 * args.users + 1} statements for {args.users} users)")
+
+        token = generate_token(1, 'farmer000000', 'admin')
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        cases = [
+            ('all users', '/api/admin/users'),
+            ('page 1 by recognitions', '/api/admin/users?sort=recognitionCount&order=desc&limit=50'),
+            ('page 20 by createdAt', '/api/admin/users?sort=createdAt&order=desc&limit=50&page=20'),
+            ('active, recently active', '/api/admin/users?active=true&recentlyActive=true&limit=50'),
+        ]
+        for label, url in cases:
+            # 流式响应在读取 body 时才执行查询
+            data, elapsed, statements = measure(lambda: client.get(url, headers=headers).get_data())
+            body = json.loads(data)
+            print(f"counters {label}: {elapsed:.2f}s, {statements} statements, "
+                  f"{len(body['data'])} of {body['total']} users")
+
+
+        drifted, elapsed, statements = measure(reconcile_counters)
+        print(f"reconcile {args.users} users: {elapsed:.2f}s, {statements} statements, {drifted} drifted")
+
+
+if __name__ == "__main__":
+    main()
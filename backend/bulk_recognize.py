@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+离线批量识别 — 对目录或 tar/zip 归档中的图片重新打分（例如模型升级后）
+
+与 /api/recognize 使用同一个推理引擎和预处理流水线，按 CPU 核数启动进程池。
+结果批量写入 recognition_details/history，或写入 JSONL 文件。写入数据库时记录日期取图片文件的时间，
+重新打分不计入识别量汇总和用户识别计数。
+成功处理的图片的内容哈希按模型版本记录在检查点文件中，中断后重新运行会跳过，失败的图片会重试。
+
+用法:
+    python bulk_recognize.py /data/archive.tar --output results.jsonl
+    python bulk_recognize.py /data/uploads --output db --user-id 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import Config
+from services.inference import InferenceEngine
+from services.model_registry import ModelRegistry
+from services.result_cache import content_hash
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+
+_engine: InferenceEngine | None = None
+_keep_display = False
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run the recognition model over a directory or tar/zip archive of images."
+    )
+    parser.add_argument("source", help="Image directory, .tar(.gz) or .zip archive")
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="'db' to insert recognition_details/history rows, or a .jsonl file path",
+    )
+    parser.add_argument(
+        "--model-version",
+        help="Registered model version to use (default: the active version in MODEL_DIR/registry.json, else MODEL_PATH)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="File recording processed image hashes (default: <output>.checkpoint)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=Config.BATCH_MAX_SIZE,
+        help=f"Images per forward pass (default: {Config.BATCH_MAX_SIZE})",
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=500,
+        help="Rows written per database commit / checkpoint flush (default: 500)",
+    )
+    parser.add_argument(
+        "--user-id",
+        type=int,
+        help="Owner of the rows written in db mode (default: none)",
+    )
+    return parser.parse_args()
+
+
+def iter_images(source: str):
+    """按顺序产出 (相对名称, 图片字节, 文件时间)，支持目录、tar 和 zip"""
+    def is_image(name):
+        return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+    def from_timestamp(ts):
+        return datetime.fromtimestamp(ts, timezone.utc)
+
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if not is_image(filename):
+                    continue
+                path = os.path.join(root, filename)
+                with open(path, 'rb') as fh:
+                    yield os.path.relpath(path, source), fh.read(), from_timestamp(os.path.getmtime(path))
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and is_image(info.filename):
+                    # zip 只记录不带时区的本地时间，按 UTC 处理
+                    yield info.filename, archive.read(info), datetime(*info.date_time, tzinfo=timezone.utc)
+    elif tarfile.is_tarfile(source):
+        # 流式读取，压缩的 tar 也不需要随机访问
+        with tarfile.open(source, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and is_image(member.name):
+                    yield member.name, archive.extractfile(member).read(), from_timestamp(member.mtime)
+    else:
+        raise ValueError(f'Unsupported source: {source}')
+
+
+def load_checkpoint(path: str, model_version: str) -> set[str]:
+    """读取当前模型版本已处理的内容哈希（每行 '<版本>\\t<哈希>'）"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as fh:
+        for line in fh:
+            version, _, digest = line.strip().partition('\t')
+            if version == model_version and digest:
+                done.add(digest)
+    return done
+
+
+def resolve_version(version: str | None) -> str | None:
+    """未指定版本时与 web 服务一致：使用 registry.json 的活动版本，没有则为 None（MODEL_PATH）"""
+    return version or ModelRegistry.from_config(vars(Config)).read_state().get('active')
+
+
+def load_engine(version: str | None = None, threads: int = 1) -> InferenceEngine:
+    """加载注册表中的指定版本；version 为 None 时加载 MODEL_PATH"""
+    if version:
+        registry = ModelRegistry.from_config(vars(Config))
+        registry.threads = threads
+        return registry.load_engine(version)
+    return InferenceEngine.load(
+        Config.MODEL_BACKEND,
+        Config.MODEL_PATH,
+        labels_path=Config.MODEL_LABELS_PATH,
+        threads=threads,
+        model_version=Config.MODEL_VERSION,
+        display_size=Config.PREPROCESS_DISPLAY_SIZE,
+        precision=Config.MODEL_PRECISION,
+    )
+
+
+def _init_worker(version: str, keep_display: bool = False):
+    """进程池初始化：每个子进程加载一次模型，单线程推理避免核数超卖
+
+    keep_display 为 True 时（写入数据库）结果附带展示图 JPEG，由父进程存入上传存储。
+    """
+    global _engine, _keep_display
+    _engine = load_engine(version, threads=1)
+    _keep_display = keep_display
+
+
+def _recognize_chunk(chunk):
+    """在子进程中预处理一组图片并执行一次前向计算"""
+    results, tensors, prepared_items = [], [], []
+    for name, digest, data, captured_at in chunk:
+        try:
+            prepared = _engine.preprocessor.run(data)
+        except Exception as exc:
+            results.append({'name': name, 'digest': digest, 'error': str(exc)})
+            continue
+        tensors.append(prepared.tensor)
+        prepared_items.append((name, digest, captured_at, prepared))
+
+    if tensors:
+        try:
+            predictions = _engine.predict_batch(np.stack(tensors))
+        except Exception as exc:
+            # 推理失败只影响本批，这些图片记为失败，重新运行时再处理
+            results.extend({'name': name, 'digest': digest, 'error': str(exc)}
+                           for name, digest, _, _ in prepared_items)
+            return results
+        for (name, digest, captured_at, prepared), prediction in zip(prepared_items, predictions):
+            row = {
+                'name': name,
+                'digest': digest,
+                'capturedAt': captured_at.isoformat(),
+                'phash': prepared.phash,
+                'diseaseName': prediction.disease_name,
+                'confidence': prediction.confidence,
+                'candidates': prediction.candidates,
+            }
+            if _keep_display:
+                row['display'] = prepared.display_jpeg()
+            results.append(row)
+    return results
+
+
+class JsonlWriter:
+    def __init__(self, path: str, model_version: str):
+        self.model_version = model_version
+        self.fh = open(path, 'a', encoding='utf-8')
+
+    def write(self, rows):
+        for row in rows:
+            self.fh.write(json.dumps(dict(row, modelVersion=self.model_version), ensure_ascii=False) + '\n')
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+
+    def close(self):
+        self.fh.close()
+
+
+class DatabaseWriter:
+    def __init__(self, user_id: int | None, model_version: str):
+        from app import app
+        from models import User
+
+        self.ctx = app.app_context()
+        self.ctx.push()
+        if user_id and User.query.get(user_id) is None:
+            raise ValueError(f'User {user_id} not found')
+        self.user_id = user_id
+        self.model_version = model_version
+
+    def write(self, rows):
+        from models import db
+        from services.inference import Prediction
+        from services.recognition import save_rescored
+        from services.upload_store import get_upload_store
+
+        store = get_upload_store()
+        items = []
+        for row in rows:
+            # 与 /api/recognize 一样只保存按原图哈希命名的展示图，URL 可由静态文件服务访问
+            stored = store.find_derivative(row['digest']) or store.save_derivative(row['digest'], row['display'])
+            image_url = stored.url
+            prediction = Prediction(disease_name=row['diseaseName'], confidence=row['confidence'],
+                                    phash=row['phash'], model_version=self.model_version,
+                                    candidates=row['candidates'])
+            items.append((uuid.uuid4().hex[:32], image_url, prediction, datetime.fromisoformat(row['capturedAt'])))
+        save_rescored(self.user_id, items)
+        db.session.commit()
+
+    def close(self):
+        from models import db
+
+        db.session.remove()
+        self.ctx.pop()
+
+
+def main() -> None:
+    args = parse_args()
+    checkpoint_path = args.checkpoint or (
+        'bulk_recognize.checkpoint' if args.output == 'db' else f'{args.output}.checkpoint'
+    )
+
+    # 父进程只需要模型版本；不在这里加载 app，避免拉起识别引擎之外的服务
+    version = resolve_version(args.model_version)
+    model_version = load_engine(version).model_version
+    done = load_checkpoint(checkpoint_path, model_version)
+    print(f"Model version {model_version}; {len(done)} images already processed")
+
+    writer = (DatabaseWriter(args.user_id, model_version) if args.output == 'db'
+              else JsonlWriter(args.output, model_version))
+    checkpoint = open(checkpoint_path, 'a', encoding='utf-8')
+
+    # Pool.imap 会一次性消费输入迭代器，用信号量限制在途批次，避免整个归档读入内存
+    in_flight = threading.BoundedSemaphore(max(1, args.workers) * 4)
+    stats = {'skipped': 0}
+
+    def chunks():
+        chunk = []
+        for name, data, captured_at in iter_images(args.source):
+            digest = content_hash(data)
+            if digest in done:
+                stats['skipped'] += 1
+                continue
+            done.add(digest)
+            chunk.append((name, digest, data, captured_at))
+            if len(chunk) >= args.batch_size:
+                in_flight.acquire()
+                yield chunk
+                chunk = []
+        if chunk:
+            in_flight.acquire()
+            yield chunk
+
+    processed = failed = 0
+    pending = []
+    started = time.perf_counter()
+
+    def flush():
+        # 先写结果再记检查点，中断时最多重复处理最后一批；失败的图片不记检查点，重新运行时再试
+        ok = [row for row in pending if 'error' not in row]
+        if ok:
+            writer.write(ok)
+        checkpoint.writelines(f"{model_version}\t{row['digest']}\n" for row in ok)
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+        pending.clear()
+
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ctx.Pool(max(1, args.workers), initializer=_init_worker,
+                      initargs=(version, args.output == 'db')) as pool:
+            for results in pool.imap_unordered(_recognize_chunk, chunks()):
+                in_flight.release()
+                for row in results:
+                    if 'error' in row:
+                        failed += 1
+                        print(f"  ! {row['name']}: {row['error']}", file=sys.stderr)
+                    else:
+                        processed += 1
+                pending.extend(results)
+                if len(pending) >= args.commit_every:
+                    flush()
+                    elapsed = time.perf_counter() - started
+                    print(f"  {processed} images, {processed / elapsed:.1f} images/sec")
+        flush()
+    finally:
+        checkpoint.close()
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Processed {processed} images in {elapsed:.1f}s ({rate:.1f} images/sec); "
+          f"{failed} failed, {stats['skipped']} skipped")
+
+
+if __name__ == "__main__":
+    main()
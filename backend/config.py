@@ -3,9 +3,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = (
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL') or (
         f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}@"
         f"{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/"
         f"{os.getenv('DB_NAME')}"
@@ -14,3 +16,75 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-prod')
     JWT_SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-prod')
 
+    # 识别模型：numpy | onnx | torchscript
+    MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'numpy')
+    MODEL_PATH = os.getenv('MODEL_PATH', os.path.join(BASE_DIR, 'weights', 'classifier.npz'))
+    MODEL_LABELS_PATH = os.getenv('MODEL_LABELS_PATH')
+    MODEL_VERSION = os.getenv('MODEL_VERSION')  # 为空时使用模型文件哈希
+    INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '1'))
+    # fp32 | int8（int8 仅支持 onnx 后端，加载 quantize_model.py 生成的 *.int8.onnx 量化模型）
+    MODEL_PRECISION = os.getenv('MODEL_PRECISION', 'fp32')
+
+    # 模型注册表：MODEL_DIR/<版本>/model.{npz,onnx,pt}，MODEL_DIR/registry.json 指定活动和影子版本
+    MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(BASE_DIR, 'weights', 'models'))
+    MODEL_REGISTRY_POLL_INTERVAL = float(os.getenv('MODEL_REGISTRY_POLL_INTERVAL', '2'))
+    SHADOW_QUEUE_SIZE = int(os.getenv('SHADOW_QUEUE_SIZE', '64'))
+
+    # 启动预热：每种批大小的前向次数、预先建立的数据库连接数、未就绪时的重试间隔（秒）
+    WARMUP_ITERATIONS = int(os.getenv('WARMUP_ITERATIONS', '2'))
+    WARMUP_DB_CONNECTIONS = int(os.getenv('WARMUP_DB_CONNECTIONS', '4'))
+    WARMUP_RETRY_INTERVAL = float(os.getenv('WARMUP_RETRY_INTERVAL', '5'))
+
+    # 动态微批：窗口内最多凑 BATCH_MAX_SIZE 张，最长等待 BATCH_MAX_WAIT_MS 毫秒
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '8'))
+    BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', '5'))
+    INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', '30'))
+
+    # 异步识别任务：local 为进程池 + 内存队列，database 为轮询 recognition_jobs 表；
+    # running 超过 JOB_RUNNING_TIMEOUT 秒的任务视为执行进程已退出，启动时改回 pending 重新执行
+    JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'local')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '1'))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+    JOB_RUNNING_TIMEOUT = float(os.getenv('JOB_RUNNING_TIMEOUT', '600'))
+    # 任务原图暂存目录（不在静态目录下，任务结束后删除）；单独运行 job_worker.py 时须为共享目录
+    JOB_STAGING_FOLDER = os.getenv('JOB_STAGING_FOLDER', os.path.join(BASE_DIR, 'job_staging'))
+
+    # 识别结果缓存：内存 LRU 条目数；RESULT_CACHE_DIR 非空时启用共享磁盘层
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', '1024'))
+    RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR')
+
+    # 近重复检测：dHash 汉明距离阈值，-1 表示关闭
+    PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', '6'))
+    PHASH_INDEX_SIZE = int(os.getenv('PHASH_INDEX_SIZE', '50000'))
+
+    # 上传文件按内容哈希分片存储：UPLOAD_FOLDER/ab/cd/<sha256>.<ext>
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'static', 'uploads'))
+    UPLOAD_URL_PREFIX = os.getenv('UPLOAD_URL_PREFIX', '/static/uploads')
+
+    # 预处理：上传图片缩小到该尺寸（长边像素）后保存为展示图，原图不落盘
+    PREPROCESS_DISPLAY_SIZE = int(os.getenv('PREPROCESS_DISPLAY_SIZE', '1024'))
+
+    # 分块识别（/api/recognize?mode=tiled）：原图上的图块边长（像素）、重叠比例、图块数上限、返回的热点数
+    TILE_SIZE = int(os.getenv('TILE_SIZE', '448'))
+    TILE_OVERLAP = float(os.getenv('TILE_OVERLAP', '0.25'))
+    TILE_MAX_COUNT = int(os.getenv('TILE_MAX_COUNT', '12'))
+    TILE_HOTSPOTS = int(os.getenv('TILE_HOTSPOTS', '5'))
+
+    # 识别结果返回的候选病害数（最多 5 个），每个候选附带知识库条目
+    RECOGNITION_TOP_K = int(os.getenv('RECOGNITION_TOP_K', '3'))
+
+    # 知识库快照：检查 cache_versions 计数器的间隔（秒）；直接改库时的最长重建间隔（秒）
+    KNOWLEDGE_VERSION_CHECK_INTERVAL = float(os.getenv('KNOWLEDGE_VERSION_CHECK_INTERVAL', '2'))
+    KNOWLEDGE_SNAPSHOT_MAX_AGE = float(os.getenv('KNOWLEDGE_SNAPSHOT_MAX_AGE', '300'))
+    # 知识库接口的 Cache-Control max-age（秒）；过期后客户端带 If-None-Match 重新验证
+    KNOWLEDGE_CACHE_MAX_AGE = int(os.getenv('KNOWLEDGE_CACHE_MAX_AGE', '60'))
+
+    # 管理后台统计：识别量日汇总表维护的时区（逗号分隔，第一个为默认）
+    STATS_TIMEZONES = [tz.strip() for tz in os.getenv('STATS_TIMEZONES', 'Asia/Shanghai,UTC').split(',') if tz.strip()]
+
+    # 管理后台统计缓存：结果最长缓存时间（秒）；检查数据指纹（是否有新的识别记录或反馈）的间隔（秒）
+    ADMIN_STATS_CACHE_TTL = float(os.getenv('ADMIN_STATS_CACHE_TTL', '30'))
+    ADMIN_STATS_VERSION_CHECK_INTERVAL = float(os.getenv('ADMIN_STATS_VERSION_CHECK_INTERVAL', '2'))
+
+    # 批量识别接口单次最多接收的图片数
+    BATCH_UPLOAD_MAX_FILES = int(os.getenv('BATCH_UPLOAD_MAX_FILES', '50'))
@@ -0,0 +1,17 @@
+"""
+gunicorn 配置 — 由 run_gunicorn.sh 通过 --config 加载（在 backend 目录下直接运行 gunicorn 时也会自动读取）
+
+预热只在 gunicorn worker 中执行：迁移脚本、批量识别和任务子进程等导入 app 时不会加载模型。
+"""
+
+
+def post_worker_init(worker):
+    """worker 加载 app 之后加载识别模型（之后常驻内存）并完成预热，然后接手未完成的异步任务"""
+    from app import app
+    from services.jobs import resume_jobs
+    from services.warmup import warmup
+
+    warmup(app)
+    resumed = resume_jobs(app)
+    if resumed:
+        app.logger.info('Resumed %d pending recognition jobs', resumed)
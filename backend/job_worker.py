@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+异步识别任务进程池 — 在 gunicorn 之外单独运行，轮询 recognition_jobs 表
+
+用法: JOB_WORKERS=0 启动 web 服务，然后运行
+    python job_worker.py --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from services.jobs import start_workers
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drain pending recognition jobs from the database.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds to sleep when no job is pending (default: 1.0)",
+    )
+    parser.add_argument(
+        "--running-timeout",
+        type=float,
+        default=600.0,
+        help="Requeue jobs still running after this many seconds at startup (default: 600)",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    processes = start_workers('database', args.workers, args.poll_interval, args.running_timeout)
+    print(f"Started {len(processes)} recognition job workers")
+    try:
+        while all(proc.is_alive() for proc in processes):
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in processes:
+            proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,98 @@ def migrate_database():
                 ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
             """))
             
+            # 5. 为 recognition_details 表添加感知哈希字段
+            print("更新 recognition_details 表（感知哈希）...")
+            db.session.execute(text("""
+                ALTER TABLE recognition_details 
+                ADD COLUMN IF NOT EXISTS phash VARCHAR(16),
+                ADD INDEX IF NOT EXISTS idx_phash (phash)
+            """))
+            
+            # 6. 为 recognition_details 表添加模型版本字段
+            print("更新 recognition_details 表（模型版本）...")
+            db.session.execute(text("""
+                ALTER TABLE recognition_details 
+                ADD COLUMN IF NOT EXISTS model_version VARCHAR(64),
+                ADD INDEX IF NOT EXISTS idx_model_version (model_version)
+            """))
+            
+            # 7. 为 recognition_details 表添加分块识别热点字段
+            print("更新 recognition_details 表（分块识别热点）...")
+            db.session.execute(text("""
+                ALTER TABLE recognition_details 
+                ADD COLUMN IF NOT EXISTS hotspots TEXT
+            """))
+            
+            # 8. 为 recognition_details 表添加候选病害字段
+            print("更新 recognition_details 表（候选病害）...")
+            db.session.execute(text("""
+                ALTER TABLE recognition_details 
+                ADD COLUMN IF NOT EXISTS top_k TEXT
+            """))
+            
+            # 9. 创建缓存版本表
+            print("创建 cache_versions 表...")
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS cache_versions (
+                    name VARCHAR(64) PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+            """))
+            
+            # 10. 游标分页使用的复合索引
+            print("添加游标分页索引...")
+            db.session.execute(text("""
+                ALTER TABLE history 
+                ADD INDEX IF NOT EXISTS idx_date_id (date, id),
+                ADD INDEX IF NOT EXISTS idx_user_date_id (user_id, date, id)
+            """))
+            db.session.execute(text("""
+                ALTER TABLE feedbacks 
+                ADD INDEX IF NOT EXISTS idx_created_id (created_at, id)
+            """))
+            db.session.execute(text("""
+                ALTER TABLE knowledge_base 
+                ADD INDEX IF NOT EXISTS idx_category_pest (category, pest_id)
+            """))
+            
+            # 11. 创建识别量日汇总表（创建后运行 backfill_stats.py 回填历史数据）
+            print("创建 history_daily_stats 表...")
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS history_daily_stats (
+                    timezone VARCHAR(64) NOT NULL,
+                    day DATE NOT NULL,
+                    disease_name VARCHAR(128) NOT NULL,
+                    count INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (timezone, day, disease_name)
+                )
+            """))
+            
+            # 12. 用户反馈计数（添加后运行 reconcile_user_counts.py 按现有记录修正计数）
+            print("更新 users 表（反馈计数）...")
+            db.session.execute(text("""
+                ALTER TABLE users 
+                ADD COLUMN IF NOT EXISTS feedback_count INT DEFAULT 0
+            """))
+            
+            # 13. 创建异步识别任务表
+            print("创建 recognition_jobs 表...")
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS recognition_jobs (
+                    id VARCHAR(64) PRIMARY KEY,
+                    user_id INT DEFAULT NULL,
+                    image_url VARCHAR(512) NOT NULL,
+                    status ENUM('pending','running','done','failed') NOT NULL DEFAULT 'pending',
+                    error TEXT,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP NULL DEFAULT NULL,
+                    finished_at TIMESTAMP NULL DEFAULT NULL,
+                    INDEX idx_status_created (status, created_at),
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+                )
+            """))
+            
             db.session.commit()
             print("✅ 数据库迁移成功完成！")
             
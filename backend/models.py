@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, Integer, String, Text, Enum, DECIMAL, Date, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Enum, DECIMAL, Date, DateTime, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from flask_sqlalchemy import SQLAlchemy
@@ -25,11 +25,17 @@ class User(db.Model):
     )
     last_login = Column(DateTime(timezone=True), nullable=True)
     recognition_count = Column(Integer, default=0)  # 识别次数统计
+    feedback_count = Column(Integer, default=0)  # 反馈次数统计
     is_active = Column(Boolean, default=True)  # 用户是否活跃
 
 
 class History(db.Model):
     __tablename__ = 'history'
+    __table_args__ = (
+        # 游标分页：按 (date, id) 倒序，普通用户只看自己的记录
+        Index('idx_date_id', 'date', 'id'),
+        Index('idx_user_date_id', 'user_id', 'date', 'id'),
+    )
     
     id = Column(String(32), primary_key=True)
     user_id = Column(Integer, nullable=True)  # 关联用户ID
@@ -52,11 +58,32 @@ class RecognitionDetail(db.Model):
     solution_title = Column(String(256))
     solution_steps = Column(Text)  # JSON 字符串
     image_url = Column(String(512))
+    phash = Column(String(16), index=True)  # 感知哈希（dHash），用于近重复检测
+    model_version = Column(String(64), index=True)  # 产生该结果的模型版本
+    hotspots = Column(Text)  # 分块识别的病斑区域，JSON 字符串
+    top_k = Column(Text)  # 前 k 个候选病害及置信度，JSON 字符串
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class RecognitionJob(db.Model):
+    __tablename__ = 'recognition_jobs'
+
+    id = Column(String(64), primary_key=True)  # 与 recognition_details.id 相同
+    user_id = Column(Integer, nullable=True)
+    image_url = Column(String(512), nullable=False)
+    status = Column(Enum('pending', 'running', 'done', 'failed'), nullable=False, default='pending')
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class KnowledgeBase(db.Model):
     __tablename__ = 'knowledge_base'
+    __table_args__ = (
+        # 快照重建和游标分页的排序键
+        Index('idx_category_pest', 'category', 'pest_id'),
+    )
     
     pest_id = Column(Integer, primary_key=True)
     category = Column(String(50), nullable=False)
@@ -78,6 +105,10 @@ class KnowledgeBase(db.Model):
 
 class Feedback(db.Model):
     __tablename__ = 'feedbacks'
+    __table_args__ = (
+        # 游标分页：按 (created_at, id) 倒序
+        Index('idx_created_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, nullable=True)  # 改为 Integer 类型，关联用户ID
@@ -90,3 +121,21 @@ class Feedback(db.Model):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+
+class CacheVersion(db.Model):
+    """进程内缓存的版本计数器：数据变更时与变更在同一事务内递增，各 worker 据此失效本地缓存"""
+    __tablename__ = 'cache_versions'
+
+    name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class HistoryDailyStat(db.Model):
+    """识别量日汇总：按 (时区, 本地日期, 病害) 计数，写入识别记录时增量维护，backfill_stats.py 可重建"""
+    __tablename__ = 'history_daily_stats'
+
+    timezone = Column(String(64), primary_key=True)
+    day = Column(Date, primary_key=True)
+    disease_name = Column(String(128), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
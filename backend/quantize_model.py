@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+生成 int8 量化模型并输出精度/速度对比报告
+
+从 UPLOAD_FOLDER 中抽取已保存的上传图片，一半用于校准，另一半用于对比浮点模型。
+量化模型保存在原模型旁（model.npz -> model.int8.npz），报告保存为 *.int8.report.json。
+部署时设置 MODEL_PRECISION=int8 即加载量化版本。
+
+用法:
+    python quantize_model.py                 # MODEL_PATH 指定的模型
+    python quantize_model.py --version v3    # MODEL_DIR 中注册的版本
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from config import Config
+from services.inference import InferenceEngine, quantized_path
+from services.model_registry import ModelRegistry
+from services.quantization import QUANTIZERS, compare, sample_calibration_images
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Quantize the recognition model to int8 and report accuracy vs. speed.")
+    parser.add_argument("--version", help="Registered model version in MODEL_DIR (default: MODEL_PATH)")
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=512,
+        help="Stored uploads to sample; half calibrate, half evaluate (default: 512)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=Config.BATCH_MAX_SIZE,
+        help=f"Batch size for the speed comparison (default: {Config.BATCH_MAX_SIZE})",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Inference threads for both models; 1 measures per-core throughput (default: 1)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Sampling seed (default: 0)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.version:
+        backend, model_path, labels_path = ModelRegistry.from_config(vars(Config)).model_files(args.version)
+    else:
+        backend, model_path, labels_path = Config.MODEL_BACKEND, Config.MODEL_PATH, Config.MODEL_LABELS_PATH
+    if backend not in QUANTIZERS:
+        print(f"Error: int8 quantization is not supported for the {backend} backend", file=sys.stderr)
+        sys.exit(1)
+
+    load_args = dict(labels_path=labels_path, threads=args.threads, model_version=args.version,
+                     display_size=Config.PREPROCESS_DISPLAY_SIZE)
+    fp32 = InferenceEngine.load(backend, model_path, **load_args)
+
+    paths = sample_calibration_images(Config.UPLOAD_FOLDER, args.samples, args.seed)
+    tensors = []
+    for path in paths:
+        try:
+            tensors.append(fp32.image_to_tensor(path))
+        except (OSError, ValueError):
+            continue
+    if not tensors:
+        print(f"Error: no readable images under {Config.UPLOAD_FOLDER}", file=sys.stderr)
+        sys.exit(1)
+    tensors = np.stack(tensors)
+    split = max(1, len(tensors) // 2)
+    calibration, evaluation = tensors[:split], tensors[split:]
+    if not len(evaluation):
+        print("Warning: too few images for a hold-out set; evaluating on the calibration images")
+        evaluation = calibration
+
+    output = quantized_path(model_path)
+    print(f"Calibrating {backend} model {model_path} on {len(calibration)} images...")
+    QUANTIZERS[backend](model_path, output, calibration)
+    int8 = InferenceEngine.load(backend, model_path, precision='int8', **load_args)
+
+    print(f"Comparing on {len(evaluation)} held-out images...")
+    report = {
+        'model': model_path,
+        'quantizedModel': output,
+        'backend': backend,
+        'threads': args.threads,
+        'batchSize': args.batch_size,
+        'calibrationImages': len(calibration),
+        'fp32SizeBytes': os.path.getsize(model_path),
+        'int8SizeBytes': os.path.getsize(output),
+        **compare(fp32, int8, evaluation, args.batch_size),
+    }
+    report_path = os.path.splitext(output)[0] + '.report.json'
+    with open(report_path, 'w', encoding='utf-8') as fh:
+        json.dump(report, fh, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"✅ Wrote {output} and {report_path}; deploy with MODEL_PRECISION=int8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+修正用户识别数、反馈数计数器（users.recognition_count / users.feedback_count）
+
+计数器随识别和反馈的写入在同一事务内维护；首次添加 feedback_count 列、
+直接改动过 history / feedbacks 表，或怀疑计数有偏差时运行。按 history / feedbacks 的
+分组计数重写有偏差的用户，可重复执行。
+
+用法:
+    python reconcile_user_counts.py              # 修正全部用户
+    python reconcile_user_counts.py --dry-run    # 只统计有偏差的用户数
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from app import app
+from models import db
+from services.user_stats import reconcile_counters
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Recompute per-user recognition and feedback counters.")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=5000,
+        help="Users checked per query (default: 5000)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report how many users have drifted counters",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            drifted = reconcile_counters(args.batch_size, args.dry_run)
+            if args.dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        action = "found" if args.dry_run else "repaired"
+        print(f"✅ {action} {drifted} users with drifted counters in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
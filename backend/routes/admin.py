@@ -1,7 +1,17 @@
-from flask import Blueprint, request, jsonify
-from models import db, KnowledgeBase, User, Feedback, History, RecognitionDetail
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from models import db, KnowledgeBase, User, Feedback, RecognitionDetail
 from utils import admin_required, hash_password
-from sqlalchemy import func, extract
+from services.batching import get_scheduler
+from services.knowledge import get_knowledge_store
+from services.model_registry import get_model_registry
+from services.name_resolver import split_aliases
+from services.pagination import NEXT_CURSOR_HEADER, decode_cursor, keyset_page
+from services.result_cache import get_result_cache
+from services.phash import cluster, get_near_duplicate_index
+from services.stats import recognition_trends
+from services.stats_cache import get_stats_cache
+from services.user_stats import SORT_KEYS, count_users, user_filters, user_list_query
+from sqlalchemy import func
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 import json
@@ -45,6 +55,17 @@ def was_recently_active(dt: datetime | None, days: int = 30) -> bool:
     return aware >= datetime.now(UTC) - timedelta(days=days)
 
 
+def parse_flag(value: str | None) -> bool | None:
+    """解析 true/false 查询参数，未传时返回 None"""
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true'):
+        return True
+    if value.lower() in ('0', 'false'):
+        return False
+    raise ValueError('Invalid boolean parameter')
+
+
 def serialize_admin_user(user, tz_name: str = DEFAULT_TIMEZONE):
     """格式化管理员账户信息"""
     return {
@@ -85,15 +106,62 @@ def comma_separated(value):
     return [item.strip() for item in value.split(',') if item.strip()]
 
 
+def refresh_knowledge(pest_id: int):
+    """提交后更新本 worker 的知识库快照
+
+    失败时只记录日志：修改已经提交，计数器也已前进，下次 snapshot() 检查时会整体重建。
+    """
+    try:
+        get_knowledge_store().apply(pest_id)
+    except Exception:
+        current_app.logger.exception('Failed to refresh knowledge snapshot after editing %s', pest_id)
+
+
 @admin_bp.route('/knowledge', methods=['POST'])
 @admin_required
 def create_knowledge():
-    """创建知识库条目"""
-    data = request.get_json()
-    
+    """创建知识库条目
+
+    名称或任一别名与已有条目的名称/别名相同（忽略空白、标点和全半角）时返回 409；
+    只是相近（少量错别字）时照常创建，并在 similar 中列出相近条目供核对。
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Invalid JSON body'}), 400
+    pest_id = data.get('pest_id')
+    if pest_id is not None:
+        try:
+            pest_id = int(pest_id)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'pest_id must be an integer'}), 400
+    if not isinstance(data.get('disease_name', ''), str) or not isinstance(data.get('alias_names') or '', str):
+        return jsonify({'success': False, 'error': 'disease_name and alias_names must be strings'}), 400
+
+    snapshot = get_knowledge_store().snapshot()
+    names = [data.get('disease_name', ''), *split_aliases(split_to_array(data.get('alias_names')))]
+    duplicates, similar = {}, {}
+    for name in names:
+        for match in snapshot.resolver.exact(name):
+            duplicates.setdefault(match.pest_id, match)
+        for match in snapshot.resolver.similar(name):
+            if match.distance:
+                similar.setdefault(match.pest_id, match)
+    if pest_id is not None and snapshot.by_id.get(pest_id):
+        duplicates.setdefault(pest_id, None)
+    if duplicates:
+        return jsonify({
+            'success': False,
+            'error': 'Duplicate knowledge entry',
+            'duplicates': [
+                dict(match.to_dict() if match else {'id': str(pest_id), 'kind': 'pest_id'},
+                     name=snapshot.by_id[pest_id]['name'])
+                for pest_id, match in duplicates.items()
+            ],
+        }), 409
+
     try:
         kb = KnowledgeBase(
-            pest_id=data.get('pest_id'),
+            pest_id=pest_id,
             category=data.get('category', ''),
             disease_name=data.get('disease_name', ''),
             type_info=data.get('type_info'),
@@ -111,12 +179,20 @@ def create_knowledge():
             chemical_control=';'.join(data.get('controls', {}).get('chemical', []))
         )
         db.session.add(kb)
+        get_knowledge_store().changed()
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Knowledge base item created'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    refresh_knowledge(kb.pest_id)
+    return jsonify({
+        'success': True,
+        'message': 'Knowledge base item created',
+        'similar': [dict(match.to_dict(), name=snapshot.by_id[similar_id]['name'])
+                    for similar_id, match in similar.items()],
+    })
+
 
 @admin_bp.route('/knowledge/<int:pest_id>', methods=['PUT'])
 @admin_required
@@ -162,12 +238,15 @@ def update_knowledge(pest_id):
             if 'chemical' in controls:
                 kb.chemical_control = ';'.join(controls['chemical'])
         
+        get_knowledge_store().changed()
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Knowledge base item updated'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    refresh_knowledge(pest_id)
+    return jsonify({'success': True, 'message': 'Knowledge base item updated'})
+
 
 @admin_bp.route('/knowledge/<int:pest_id>', methods=['DELETE'])
 @admin_required
@@ -180,12 +259,15 @@ def delete_knowledge(pest_id):
     
     try:
         db.session.delete(kb)
+        get_knowledge_store().changed()
         db.session.commit()
-        return jsonify({'success': True, 'message': 'Knowledge base item deleted'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    refresh_knowledge(pest_id)
+    return jsonify({'success': True, 'message': 'Knowledge base item deleted'})
+
 
 @admin_bp.route('/admins', methods=['GET'])
 @admin_required
@@ -273,20 +355,49 @@ def delete_admin(user_id):
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_users():
-    """获取所有用户列表 - 包含统计信息"""
+    """获取用户列表 - 包含识别数和反馈数
+
+    计数读取 users 表上维护的计数器（services/user_stats.py），结果按批流式输出。
+    筛选：role、active、recentlyActive（true/false）、q（用户名/邮箱关键字）
+    排序：sort=id|username|createdAt|lastLogin|recognitionCount|feedbackCount，order=asc|desc
+    分页：page、limit（不传 limit 时返回全部用户）
+    """
     tz_name = get_request_timezone()
-    users = User.query.all()
-    result = []
-    for user in users:
-        recognition_count = History.query.filter_by(user_id=user.id).count()
-        feedback_count = Feedback.query.filter_by(user_id=user.id).count()
-        serialized = serialize_basic_user(user, tz_name)
-        serialized.update({
-            'recognitionCount': recognition_count,
-            'feedbackCount': feedback_count,
-        })
-        result.append(serialized)
-    return jsonify({'success': True, 'data': result})
+    role = request.args.get('role')
+    sort = request.args.get('sort', 'id')
+    order = request.args.get('order', 'asc')
+    if role and role not in ('user', 'admin'):
+        return jsonify({'success': False, 'error': 'Invalid role'}), 400
+    if sort not in SORT_KEYS or order not in ('asc', 'desc'):
+        return jsonify({'success': False, 'error': 'Invalid sort'}), 400
+    try:
+        active = parse_flag(request.args.get('active'))
+        recently_active = parse_flag(request.args.get('recentlyActive'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conditions = user_filters(role, active, recently_active, (request.args.get('q') or '').strip())
+    query = user_list_query(conditions, sort, descending=order == 'desc')
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), 500)
+        query = query.offset((page - 1) * limit).limit(limit)
+    total = count_users(conditions)
+
+    def generate():
+        yield '{"success":true,"data":['
+        rows = db.session.execute(query.execution_options(yield_per=500))
+        for i, row in enumerate(rows):
+            serialized = serialize_basic_user(row, tz_name)
+            serialized.update({
+                'recognitionCount': int(row.recognition_count),
+                'feedbackCount': int(row.feedback_count),
+            })
+            yield (',' if i else '') + json.dumps(serialized, ensure_ascii=False)
+        yield '],' + json.dumps({'total': total, 'page': page, 'limit': limit})[1:]
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 
 @admin_bp.route('/users', methods=['POST'])
@@ -384,10 +495,27 @@ def update_user_status(user_id):
 @admin_bp.route('/stats', methods=['GET'])
 @admin_required
 def get_stats():
-    """获取管理员统计数据 - 真实数据"""
+    """获取管理员统计数据 - 真实数据
+
+    按时区缓存计算好的结果（services/stats_cache.py），有新的识别记录或反馈、或超过 TTL 后重算；
+    cacheAge 为结果已缓存的秒数，generatedAt 为计算时间。
+    """
+    tz_name = get_request_timezone()
+    payload, age = get_stats_cache().get(tz_name, lambda: build_stats(tz_name))
+    return jsonify({'success': True, **payload, 'cacheAge': round(age, 1)})
+
+
+def build_stats(tz_name: str) -> dict:
+    """计算统计数据
+
+    识别量（总数、近 7 天、近 6 个自然月）按请求的时区分桶：STATS_TIMEZONES 中的时区读取
+    history_daily_stats 汇总表，其他时区对 history 做两次范围扫描（见 services/stats.py）。
+    """
+    trends = recognition_trends(tz_name)
+
     # 基础统计
     total_users = User.query.count()
-    total_recognitions = History.query.count()
+    total_recognitions = trends['total']
     total_feedbacks = Feedback.query.count()
     
     # 活跃用户统计（最近30天有登录或识别记录）
@@ -398,14 +526,11 @@ def get_stats():
     
     # 每日识别数据（最近7天）
     recognitions_per_day = []
-    for i in range(6, -1, -1):
-        date = (datetime.now(UTC) - timedelta(days=i)).date()
-        count = History.query.filter(
-            func.date(History.created_at) == date
-        ).count()
-        day_name = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][date.weekday()]
+    for day, count in trends['daily']:
+        day_name = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][day.weekday()]
         recognitions_per_day.append({
             'date': day_name,
+            'day': day.isoformat(),
             'count': count
         })
     
@@ -437,38 +562,43 @@ def get_stats():
             {'name': '其他', 'value': 0}
         ]
     
-    # 月度识别趋势（最近6个月）
+    # 月度识别趋势（最近6个自然月）
     monthly_data = []
-    for i in range(5, -1, -1):
-        target_date = datetime.now(UTC) - timedelta(days=i*30)
-        month_name = target_date.strftime('%m月')
-        count = History.query.filter(
-            extract('year', History.created_at) == target_date.year,
-            extract('month', History.created_at) == target_date.month
-        ).count()
+    for month, count in trends['monthly']:
         monthly_data.append({
-            'month': month_name,
+            'month': month.strftime('%m月'),
             'recognitions': count
         })
     
-    return jsonify({
-        'success': True,
+    return {
         'userCount': total_users,
         'recognitionCount': total_recognitions,
         'feedbackCount': total_feedbacks,
         'activeUsers': active_users,
         'recognitionsPerDay': recognitions_per_day,
         'feedbackTypes': feedback_types,
-        'monthlyData': monthly_data
-    })
+        'monthlyData': monthly_data,
+        'timezone': tz_name,
+        'generatedAt': convert_datetime(datetime.now(UTC), tz_name),
+    }
 
 
 @admin_bp.route('/feedbacks', methods=['GET'])
 @admin_required
 def get_feedbacks():
-    """获取所有反馈 - 包含类型信息"""
+    """获取反馈列表 - 包含类型信息
+
+    按 (created_at, id) 倒序分页，每页 limit 条（默认 100）；还有下一页时返回 nextCursor，?cursor= 继续取。
+    """
     tz_name = get_request_timezone()
-    feedbacks = Feedback.query.order_by(Feedback.created_at.desc()).all()
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 500)
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = decode_cursor(request.args['cursor'], [datetime.fromisoformat, int])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    feedbacks, next_cursor = keyset_page(Feedback.query, [Feedback.created_at, Feedback.id], cursor, limit)
     result = []
     for fb in feedbacks:
         try:
@@ -489,7 +619,10 @@ def get_feedbacks():
             'updatedAt': convert_datetime(fb.updated_at, tz_name)
         })
     
-    return jsonify({'success': True, 'data': result})
+    response = jsonify({'success': True, 'data': result, 'nextCursor': next_cursor})
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
 
 
 @admin_bp.route('/feedbacks/<int:feedback_id>/status', methods=['PUT'])
@@ -532,3 +665,93 @@ def update_feedback_status(feedback_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+
+
+@admin_bp.route('/inference/stats', methods=['GET'])
+@admin_required
+def get_inference_stats():
+    """获取本 worker 的推理统计（批大小分布、排队等待分布、结果缓存命中、统计缓存）"""
+    return jsonify({'success': True, 'data': {
+        'batching': get_scheduler().stats(),
+        'resultCache': get_result_cache().stats(),
+        'nearDuplicates': get_near_duplicate_index().stats(),
+        'statsCache': get_stats_cache().stats(),
+    }})
+
+
+@admin_bp.route('/models', methods=['GET'])
+@admin_required
+def get_models():
+    """获取磁盘上的模型版本、活动/影子版本及本 worker 的各版本延迟和一致率"""
+    registry = get_model_registry()
+    return jsonify({'success': True, 'data': dict(registry.stats(), state=registry.read_state())})
+
+
+@admin_bp.route('/models/active', methods=['PUT'])
+@admin_required
+def activate_model():
+    """切换活动模型版本；所有 worker 在下一次轮询时热切换，无需重启"""
+    data = request.get_json() or {}
+    version = data.get('version')
+    registry = get_model_registry()
+    try:
+        registry.activate(version)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'data': registry.read_state()})
+
+
+@admin_bp.route('/models/shadow', methods=['PUT'])
+@admin_required
+def set_shadow_model():
+    """设置影子模型版本和抽样率（version 为空时关闭影子评估）"""
+    data = request.get_json() or {}
+    version = data.get('version')
+    try:
+        sample_rate = float(data.get('sampleRate', 0.1))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid sampleRate'}), 400
+    registry = get_model_registry()
+    try:
+        registry.set_shadow(version, sample_rate)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'data': registry.read_state()})
+
+
+@admin_bp.route('/duplicates', methods=['GET'])
+@admin_required
+def get_duplicate_clusters():
+    """按感知哈希查找近重复的识别图片簇（最近 limit 条记录内）"""
+    tz_name = get_request_timezone()
+    threshold = min(max(request.args.get('threshold', 6, type=int), 0), 16)
+    limit = min(max(request.args.get('limit', 5000, type=int), 1), 50000)
+
+    rows = db.session.query(
+        RecognitionDetail.id,
+        RecognitionDetail.phash,
+        RecognitionDetail.image_url,
+        RecognitionDetail.disease_name,
+        RecognitionDetail.confidence,
+        RecognitionDetail.created_at,
+    ).filter(RecognitionDetail.phash.isnot(None)).order_by(
+        RecognitionDetail.created_at.desc()
+    ).limit(limit).all()
+
+    clusters = cluster([(row.phash, row) for row in rows], threshold)
+    data = [{
+        'size': len(group),
+        'items': [{
+            'id': row.id,
+            'phash': row.phash,
+            'imageUrl': row.image_url or '',
+            'diseaseName': row.disease_name,
+            'confidence': float(row.confidence) if row.confidence is not None else 0,
+            'createdAt': convert_datetime(row.created_at, tz_name),
+        } for row in group],
+    } for group in clusters]
+    return jsonify({'success': True, 'data': data, 'scanned': len(rows), 'threshold': threshold})
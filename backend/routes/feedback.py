@@ -1,10 +1,9 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from models import db, Feedback, User
 from utils import token_required, get_current_user
+from services.upload_store import get_upload_store
+from services.user_stats import count_feedbacks
 import json
-import os
-import uuid
-from werkzeug.utils import secure_filename
 
 feedback_bp = Blueprint('feedback', __name__)
 
@@ -25,18 +24,12 @@ def submit_feedback():
         feedback_type = request.form.get('feedbackType', 'general')
         images = request.files.getlist('images')  # 多个文件
 
-        # 保存图片到 static/uploads
+        # 流式保存图片到内容寻址存储，相同图片只存一份
         image_urls = []
-        if images:
-            upload_dir = current_app.static_folder or 'static'
-            upload_dir = os.path.join(upload_dir, 'uploads')
-            os.makedirs(upload_dir, exist_ok=True)
-            for img in images:
-                if img.filename:
-                    filename = secure_filename(img.filename or f"fb_{uuid.uuid4().hex}.jpg")
-                    path = os.path.join(upload_dir, filename)
-                    img.save(path)
-                    image_urls.append(f"/static/uploads/{filename}")
+        store = get_upload_store()
+        for img in images:
+            if img.filename:
+                image_urls.append(store.save(img).url)
     else:
         # JSON body
         data = request.get_json()
@@ -59,6 +52,7 @@ def submit_feedback():
             status='new'
         )
         db.session.add(fb)
+        count_feedbacks([fb])
         db.session.commit()
         return jsonify({'success': True, 'message': 'Feedback submitted successfully'})
     except Exception as e:
@@ -1,97 +1,89 @@
-from flask import Blueprint, request, jsonify
-from models import KnowledgeBase
-import json
+from flask import Blueprint, request, jsonify, Response, current_app
+from services.inference import ModelNotLoadedError, get_engine
+from services.knowledge import get_knowledge_store, parse_fields
+from services.pagination import NEXT_CURSOR_HEADER, decode_cursor
 
 knowledge_bp = Blueprint('knowledge', __name__)
 
 
-def split_to_array(value):
-    """将文本分割为数组（支持多种分隔符）"""
-    if not value:
-        return []
-    return [item.strip() for item in value.replace('；', ';').replace('、', ',').split(';') if item.strip()]
+def cached_response(payload: bytes, etag: str, next_cursor: str | None = None):
+    """返回带强 ETag 和 Cache-Control 的响应；If-None-Match 命中时为不带正文的 304"""
+    response = Response(payload, mimetype='application/json')
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('KNOWLEDGE_CACHE_MAX_AGE', 60)
+    response.cache_control.must_revalidate = True
+    return response.make_conditional(request)
 
 
-def comma_separated(value):
-    """将逗号分隔的字符串转为数组"""
-    if not value:
+def model_labels() -> list[str]:
+    """当前 worker 已加载模型的标签；模型未加载时为空"""
+    try:
+        return get_engine().labels
+    except ModelNotLoadedError:
         return []
-    return [item.strip() for item in value.split(',') if item.strip()]
 
 
 @knowledge_bp.route('/knowledge', methods=['GET'])
 def get_knowledge():
-    """获取知识库列表（支持分页）"""
+    """获取知识库列表（支持分页）— 直接返回快照中预先编码的 JSON
+
+    还有下一页时 X-Next-Cursor 响应头给出游标，?cursor= 按 (category, pest_id) 继续取（优先于 page）。
+    带 ?name= 时按病害名称或别名解析为单个条目（5 个字以上的名称容忍少量错别字；
+    名称本身是模型的另一个标签时不做近似匹配）。
+    ?fields=id,name,... 只返回指定字段；view=summary 只返回 id、category、name 和第一张图片 imageUrl。
+    """
+    name = request.args.get('name')
+    if name is not None:
+        item, match = get_knowledge_store().resolve(name, labels=model_labels())
+        if item is None:
+            return jsonify({'success': False, 'error': 'Knowledge item not found'}), 404
+        return jsonify({'success': True, 'data': item, 'match': match.to_dict()})
+
     page = request.args.get('page', 1, type=int)
     limit = request.args.get('limit', 100, type=int)
     category = request.args.get('category', None)
-    
-    query = KnowledgeBase.query
-    
-    if category and category != '全部':
-        query = query.filter_by(category=category)
-    
-    total = query.count()
-    items = query.order_by(KnowledgeBase.category, KnowledgeBase.pest_id).offset((page - 1) * limit).limit(limit).all()
-    
-    result = []
-    for item in items:
-        result.append({
-            'id': str(item.pest_id),
-            'category': item.category,
-            'name': item.disease_name,
-            'type': item.type_info or '',
-            'aliases': split_to_array(item.alias_names),
-            'keyFeatures': item.core_features or '',
-            'affectedParts': split_to_array(item.affected_parts),
-            'imageUrls': comma_separated(item.symptom_images),
-            'pathogen': item.pathogen_source or '',
-            'conditions': item.occurrence_conditions or '',
-            'lifeCycle': item.generations_periods or '',
-            'transmission': item.transmission_routes or '',
-            'controls': {
-                'agricultural': split_to_array(item.agricultural_control),
-                'physical': split_to_array(item.physical_control),
-                'biological': split_to_array(item.biological_control),
-                'chemical': split_to_array(item.chemical_control),
-            }
-        })
-    
+    try:
+        fields = parse_fields(request.args.get('fields'), request.args.get('view'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    snapshot = get_knowledge_store().snapshot()
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            start = snapshot.cursor_start(category, decode_cursor(cursor, [str, int]))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    else:
+        start = (page - 1) * limit
+
     # 返回 result 数组（不包装在 data 字段中，frontend 直接调用 response.json()）
-    return jsonify(result)
+    return cached_response(*snapshot.list_payload(category, start, limit, fields))
 
 
 @knowledge_bp.route('/knowledge/<int:pest_id>', methods=['GET'])
 def get_knowledge_by_id(pest_id):
     """获取单个知识库条目"""
-    item = KnowledgeBase.query.filter_by(pest_id=pest_id).first()
-    
-    if not item:
+    snapshot = get_knowledge_store().snapshot()
+    payload = snapshot.item_payloads.get(pest_id)
+
+    if payload is None:
         return jsonify({'success': False, 'error': 'Knowledge item not found'}), 404
-    
-    result = {
-        'id': str(item.pest_id),
-        'category': item.category,
-        'name': item.disease_name,
-        'type': item.type_info or '',
-        'aliases': split_to_array(item.alias_names),
-        'keyFeatures': item.core_features or '',
-        'affectedParts': split_to_array(item.affected_parts),
-        'imageUrls': comma_separated(item.symptom_images),
-        'pathogen': item.pathogen_source or '',
-        'conditions': item.occurrence_conditions or '',
-        'lifeCycle': item.generations_periods or '',
-        'transmission': item.transmission_routes or '',
-        'controls': {
-            'agricultural': split_to_array(item.agricultural_control),
-            'physical': split_to_array(item.physical_control),
-            'biological': split_to_array(item.biological_control),
-            'chemical': split_to_array(item.chemical_control),
-        }
-    }
-    
-    return jsonify({
-        'success': True,
-        'data': result
-    })
 
+    return cached_response(payload, snapshot.item_etags[pest_id])
+
+
+@knowledge_bp.route('/knowledge/search', methods=['GET'])
+def search_knowledge():
+    """全文检索知识库（名称、别名、特征、部位、防治措施），按相关度排序并返回高亮片段"""
+    query = (request.args.get('q') or '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+    if not query:
+        return jsonify({'success': False, 'error': 'Missing search query'}), 400
+
+    total, results = get_knowledge_store().search(query, limit)
+    return jsonify({'success': True, 'data': results, 'total': total})
@@ -1,31 +1,57 @@
 from flask import Blueprint, request, jsonify, current_app
-from models import db, History, RecognitionDetail, User
+from models import db, History, RecognitionDetail, RecognitionJob
 from utils import token_required, get_current_user
+from services import jobs
+from services.inference import get_engine, ModelNotLoadedError
+from services.batching import get_scheduler
+from services.model_registry import get_model_registry
+from services.pagination import NEXT_CURSOR_HEADER, decode_cursor, keyset_page
+from services.recognition import (
+    candidates_of, lookup_prediction, remember_prediction, save_recognition, save_recognitions, with_knowledge,
+)
+from services.result_cache import content_hash
+from services.tiling import predict_tiled
+from services.upload_store import get_upload_store
+from datetime import date
 import uuid
 import json
-from datetime import datetime, timezone
+import numpy as np
 
 recognition_bp = Blueprint('recognition', __name__)
 
 
+def requested_top_k() -> int:
+    """?topK= 覆盖默认候选数"""
+    return request.args.get('topK', current_app.config.get('RECOGNITION_TOP_K', 3), type=int)
+
+
 @recognition_bp.route('/history', methods=['GET'])
 @token_required
 def get_history():
-    """返回识别历史列表 — 直接返回 array（不包装在 data 字段）"""
+    """返回识别历史列表 — 直接返回 array（不包装在 data 字段）
+
+    按 (date, id) 倒序；还有下一页时 X-Next-Cursor 响应头给出游标，?cursor= 继续取（优先于 page）。
+    """
     page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 50, type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = decode_cursor(request.args['cursor'], [date.fromisoformat, str])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
     
     # 获取当前用户
     user = get_current_user()
 
     # 如果是普通用户，只返回自己的记录
     if user and user.role != 'admin':
-        query = History.query.filter_by(user_id=user.id).order_by(History.date.desc())
+        query = History.query.filter_by(user_id=user.id)
     else:
-        query = History.query.order_by(History.date.desc())
+        query = History.query
     
-    total = query.count()
-    items = query.offset((page - 1) * limit).limit(limit).all()
+    items, next_cursor = keyset_page(query, [History.date, History.id], cursor, limit,
+                                     offset=(max(page, 1) - 1) * limit)
 
     result = []
     for h in items:
@@ -37,7 +63,10 @@ def get_history():
             'confidence': float(h.confidence) if h.confidence is not None else 0,
         })
 
-    return jsonify(result)
+    response = jsonify(result)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
 
 
 @recognition_bp.route('/recognitions/<string:recog_id>', methods=['GET'])
@@ -46,7 +75,16 @@ def get_recognition_detail(recog_id):
     """返回单个识别结果详情 — 返回不包装的数据对象"""
     r = RecognitionDetail.query.get(recog_id)
     if not r:
-        return jsonify({'success': False, 'error': 'Recognition not found'}), 404
+        # 异步任务尚未完成时返回任务状态
+        job = RecognitionJob.query.get(recog_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Recognition not found'}), 404
+        return jsonify({
+            'id': job.id,
+            'status': job.status,
+            'error': job.error or '',
+            'imageUrl': job.image_url or '',
+        })
 
     # 解析 solution_steps 字段（JSON 或换行分隔）
     steps = []
@@ -67,7 +105,11 @@ def get_recognition_detail(recog_id):
             'steps': steps,
         },
         'imageUrl': r.image_url or '',
+        'status': 'done',
+        'hotspots': json.loads(r.hotspots) if r.hotspots else [],
     }
+    candidates = json.loads(r.top_k) if r.top_k else [{'diseaseName': r.disease_name, 'confidence': data['confidence']}]
+    data['candidates'] = with_knowledge(candidates, requested_top_k())
 
     return jsonify(data)
 
@@ -75,72 +117,190 @@ def get_recognition_detail(recog_id):
 @recognition_bp.route('/recognize', methods=['POST'])
 @token_required
 def recognize_image():
-    """接收上传图片并创建一个模拟的识别结果（演示用）"""
+    """接收上传图片，调用常驻推理引擎生成识别结果
+
+    ?async=1 时提交后台任务并返回 202（缓存命中或没有任务进程时直接返回结果）；
+    ?mode=tiled 时对图片分块识别并返回病斑热点（只能同步执行，与 async=1 同时使用时返回 400，不使用结果缓存）。
+    """
+    try:
+        engine = get_engine()
+    except ModelNotLoadedError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
     # 获取当前用户
     user = get_current_user()
     user_id = user.id if user else None
+    run_async = request.args.get('async', '0').lower() in ('1', 'true')
+    tiled = request.args.get('mode') == 'tiled'
+    if run_async and tiled:
+        return jsonify({'success': False, 'error': 'Tiled recognition does not support async=1'}), 400
+    if run_async and not jobs.accepts_jobs(current_app):
+        # local 模式且 JOB_WORKERS=0 时没有进程消费队列，任务会一直 pending，改为同步识别
+        run_async = False
     
-    # 支持 multipart/form-data 上传文件，或 JSON body with imageUrl
+    # 支持 multipart/form-data 上传文件，或 JSON body with imageUrl（已上传图片）
+    store = get_upload_store()
+    staged = None
+    digest = None
     image_url = None
-    if 'file' in request.files:
-        f = request.files['file']
-        # 简单保存到 static/uploads
-        from werkzeug.utils import secure_filename
-        import os
-        upload_dir = current_app.static_folder or 'static'
-        upload_dir = os.path.join(upload_dir, 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        filename = secure_filename(f.filename or f"img_{uuid.uuid4().hex}.jpg")
-        path = os.path.join(upload_dir, filename)
-        f.save(path)
-        image_url = f"/static/uploads/{filename}"
-    else:
-        body = request.get_json(silent=True) or {}
-        image_url = body.get('imageUrl')
-
-    # 生成模拟识别结果（实际应调用模型）
     recog_id = uuid.uuid4().hex
-    disease_name = 'Unknown Disease'
-    confidence = 75.0
-    description = 'Auto-generated recognition result.'
-    cause = ''
-    solution_title = 'Suggested measures'
-    solution_steps = json.dumps(['Observe field', 'Consult expert'])
-
-    rd = RecognitionDetail(
-        id=recog_id,
-        user_id=user_id,
-        disease_name=disease_name,
-        confidence=confidence,
-        description=description,
-        cause=cause,
-        solution_title=solution_title,
-        solution_steps=solution_steps,
-        image_url=image_url or ''
-    )
-
-    # 同时写入 history
-    hist = History(
-        id=uuid.uuid4().hex[:32],
-        user_id=user_id,
-        date=datetime.now(timezone.utc).date(),
-        image_url=image_url or '',
-        disease_name=disease_name,
-        confidence=confidence
-    )
+    try:
+        if 'file' in request.files:
+            # 流式写入临时文件并计算哈希；只保存缩小后的展示图（异步任务的原图暂存到任务结束）
+            staged = store.stage(request.files['file'])
+            image_path, digest = staged.path, staged.digest
+        else:
+            body = request.get_json(silent=True) or {}
+            image_url = body.get('imageUrl')
+            image_path = store.resolve(image_url)
+        if not image_path:
+            return jsonify({'success': False, 'error': 'Image file is required'}), 400
+
+        # 相同或近重复图片（同一模型版本）直接复用已有结果，跳过预处理和推理
+        if tiled:
+            # 分块结果与整图结果不同，不读写按整图缓存的结果
+            digest = digest or content_hash(image_path)
+            prepared, prediction = engine.preprocessor.run(image_path), None
+            # 暂存的原图在下面删除，先按原始分辨率解码供切块
+            full_image = engine.preprocessor.decode_full(image_path)
+        else:
+            digest, prepared, prediction = lookup_prediction(engine, image_path, digest)
+        if staged is not None:
+            stored = store.find_derivative(digest)
+            if stored is None:
+                prepared = prepared or engine.preprocessor.run(image_path)
+                stored = store.save_derivative(digest, prepared.display_jpeg())
+            image_url = stored.url
+            if run_async and prediction is None and not tiled:
+                # 任务在原图上推理，与同步识别的输入和缓存键一致
+                jobs.stage_original(current_app, recog_id, staged.path)
+    except (OSError, ValueError) as e:
+        current_app.logger.info('Rejected upload: %s', e)
+        return jsonify({'success': False, 'error': 'Invalid image file'}), 400
+    finally:
+        if staged is not None:
+            staged.discard()
+
+    if tiled:
+        config = current_app.config
+        prediction = predict_tiled(engine, full_image, config.get('TILE_SIZE', 448),
+                                   config.get('TILE_OVERLAP', 0.25), config.get('TILE_MAX_COUNT', 12),
+                                   config.get('TILE_HOTSPOTS', 5))
+        prediction.phash = prepared.phash
+    elif prediction is None and run_async:
+        job = RecognitionJob(id=recog_id, user_id=user_id, image_url=image_url, status='pending')
+        try:
+            db.session.add(job)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            jobs.discard_original(current_app, recog_id)
+            return jsonify({'success': False, 'error': str(e)}), 500
+        jobs.enqueue(current_app, recog_id)
+        return jsonify({'success': True, 'data': {'id': recog_id, 'status': 'pending', 'imageUrl': image_url}}), 202
+
+    if prediction is None:
+        # 与并发请求合并成一批执行前向计算
+        try:
+            prediction = get_scheduler().predict(prepared.tensor, timeout=current_app.config.get('INFERENCE_TIMEOUT', 30),
+                                                 engine=engine)
+        except TimeoutError:
+            return jsonify({'success': False, 'error': 'Recognition timed out'}), 503
+        remember_prediction(engine, digest, prepared.phash, prediction)
+        get_model_registry().maybe_shadow(prepared, prediction)
+
+    try:
+        save_recognition(recog_id, user, image_url, prediction)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    # 候选病害直接附带知识库条目，客户端无需再请求详情和知识库接口
+    data = {'id': recog_id, 'status': 'done', 'diseaseName': prediction.disease_name, 'confidence': prediction.confidence, 'imageUrl': image_url,
+            'candidates': with_knowledge(candidates_of(prediction), requested_top_k())}
+    if tiled:
+        data['hotspots'] = prediction.hotspots
+    return jsonify({'success': True, 'data': data})
+
+
+@recognition_bp.route('/recognize/batch', methods=['POST'])
+@token_required
+def recognize_batch():
+    """批量识别：multipart 上传多张图片（files 字段），一次前向计算、一次提交，按上传顺序返回结果"""
+    try:
+        engine = get_engine()
+    except ModelNotLoadedError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'success': False, 'error': 'Image files are required'}), 400
+    max_files = current_app.config.get('BATCH_UPLOAD_MAX_FILES', 50)
+    if len(files) > max_files:
+        return jsonify({'success': False, 'error': f'At most {max_files} images per batch'}), 400
+
+    user = get_current_user()
+    store = get_upload_store()
+
+    # 逐张暂存、查缓存、保存展示图；未命中的张量留待统一推理
+    results = []
+    pending = {}
+    for index, f in enumerate(files):
+        staged = None
+        try:
+            staged = store.stage(f)
+            digest, prepared, prediction = lookup_prediction(engine, staged.path, staged.digest)
+            stored = store.find_derivative(digest)
+            if stored is None:
+                prepared = prepared or engine.preprocessor.run(staged.path)
+                stored = store.save_derivative(digest, prepared.display_jpeg())
+        except (OSError, ValueError) as e:
+            current_app.logger.info('Rejected upload %s: %s', f.filename, e)
+            results.append({'index': index, 'success': False, 'error': 'Invalid image file'})
+            continue
+        finally:
+            if staged is not None:
+                staged.discard()
+
+        item = {'index': index, 'success': True, 'id': uuid.uuid4().hex, 'imageUrl': stored.url,
+                'prediction': prediction}
+        results.append(item)
+        if prediction is None:
+            # 同一批内的重复图片只推理一次
+            pending.setdefault(digest, (prepared, []))[1].append(item)
+
+    if pending:
+        batch = list(pending.items())
+        try:
+            predictions = engine.predict_batch(np.stack([prepared.tensor for _, (prepared, _) in batch]))
+        except ModelNotLoadedError as e:
+            return jsonify({'success': False, 'error': str(e)}), 503
+        except Exception as e:
+            current_app.logger.exception('Batch inference failed')
+            return jsonify({'success': False, 'error': str(e)}), 500
+        for (digest, (prepared, items)), prediction in zip(batch, predictions):
+            remember_prediction(engine, digest, prepared.phash, prediction)
+            get_model_registry().maybe_shadow(prepared, prediction)
+            for item in items:
+                item['prediction'] = prediction
 
+    succeeded = [item for item in results if item['success']]
+    if not succeeded:
+        return jsonify({'success': False, 'error': 'Invalid image file', 'data': results, 'count': 0}), 400
     try:
-        db.session.add(rd)
-        db.session.add(hist)
-        
-        # 更新用户识别计数
-        if user:
-            user.recognition_count = (user.recognition_count or 0) + 1
-            user.last_login = datetime.now(timezone.utc)
-        
+        save_recognitions(user, [(item['id'], item['imageUrl'], item['prediction']) for item in succeeded])
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-    return jsonify({'success': True, 'data': {'id': recog_id, 'diseaseName': disease_name, 'confidence': confidence, 'imageUrl': image_url}})
+    data = []
+    top_k = requested_top_k()
+    for item in results:
+        if item['success']:
+            prediction = item.pop('prediction')
+            item.update({'status': 'done', 'diseaseName': prediction.disease_name, 'confidence': prediction.confidence,
+                         'candidates': with_knowledge(candidates_of(prediction), top_k)})
+        data.append(item)
+    return jsonify({'success': True, 'data': data, 'count': len(succeeded)})
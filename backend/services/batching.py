@@ -0,0 +1,132 @@
+"""
+识别请求动态微批调度
+
+并发的识别请求把预处理后的张量放入队列，后台线程在时间窗口内（最多
+max_batch_size 张、最长等待 max_wait_ms）凑成一批，执行一次批量前向计算后
+把结果分发回各个等待中的 Flask 处理线程。需要 gunicorn 以多线程方式运行
+（--threads）才能在同一 worker 内凑批。
+每个请求固定使用提交时的模型会话：热切换模型时，已预处理的请求仍由旧会话完成。
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from services.inference import get_engine, Prediction
+from services.metrics import Distribution
+
+
+class _Pending:
+    __slots__ = ('tensor', 'engine', 'future', 'enqueued_at')
+
+    def __init__(self, tensor: np.ndarray, engine):
+        self.tensor = tensor
+        self.engine = engine
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """把并发请求合并成批量前向计算"""
+
+    def __init__(self, max_batch_size: int = 8, max_wait_ms: float = 5.0):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batch_sizes = Counter()
+        self.queue_wait_ms = Distribution()
+        self.forward_ms = Distribution()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+                self._thread.start()
+
+    def submit(self, tensor: np.ndarray, engine=None) -> Future:
+        """提交单张 (3, S, S) 张量，返回 Future[Prediction]
+
+        engine 为预处理该张量的推理引擎，默认取当前活动引擎。
+        """
+        self.start()
+        pending = _Pending(tensor, engine or get_engine())
+        self._queue.put(pending)
+        return pending.future
+
+    def predict(self, tensor: np.ndarray, timeout: float | None = None, engine=None) -> Prediction:
+        return self.submit(tensor, engine).result(timeout=timeout)
+
+    def _collect(self) -> list[_Pending]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for item in batch:
+                self.queue_wait_ms.observe((started - item.enqueued_at) * 1000)
+            self.batch_sizes[len(batch)] += 1
+            # 切换模型期间同一窗口内可能混有新旧会话的请求，按会话分组执行
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item.engine), []).append(item)
+            for group in groups.values():
+                try:
+                    predictions = group[0].engine.predict_batch(np.stack([item.tensor for item in group]))
+                except Exception as exc:
+                    for item in group:
+                        item.future.set_exception(exc)
+                    continue
+                for item, prediction in zip(group, predictions):
+                    item.future.set_result(prediction)
+            self.forward_ms.observe((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> dict:
+        sizes = dict(sorted(self.batch_sizes.items()))
+        batches = sum(sizes.values())
+        return {
+            'maxBatchSize': self.max_batch_size,
+            'maxWaitMs': self.max_wait * 1000,
+            'queueDepth': self._queue.qsize(),
+            'batches': batches,
+            'meanBatchSize': round(sum(k * v for k, v in sizes.items()) / batches, 3) if batches else 0,
+            'batchSizeHistogram': {str(k): v for k, v in sizes.items()},
+            'queueWaitMs': self.queue_wait_ms.snapshot(),
+            'forwardMs': self.forward_ms.snapshot(),
+        }
+
+
+_scheduler: BatchScheduler | None = None
+
+
+def init_scheduler(app):
+    """按配置创建本 worker 的批处理调度器"""
+    global _scheduler
+    _scheduler = BatchScheduler(
+        max_batch_size=app.config.get('BATCH_MAX_SIZE', 8),
+        max_wait_ms=app.config.get('BATCH_MAX_WAIT_MS', 5.0),
+    )
+    return _scheduler
+
+
+def get_scheduler() -> BatchScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = BatchScheduler()
+    return _scheduler
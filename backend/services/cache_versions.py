@@ -0,0 +1,33 @@
+"""
+跨 worker 的缓存版本计数器（cache_versions 表）
+
+数据变更时在同一事务内调用 bump_version()，提交后计数器与数据一起生效；
+各 worker 定期用 read_version() 比较本地缓存的版本，不一致时重建。
+"""
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, CacheVersion
+
+
+def read_version(name: str) -> int:
+    version = db.session.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar()
+    return int(version or 0)
+
+
+def bump_version(name: str):
+    """递增计数器（由调用方提交事务）"""
+    result = db.session.execute(
+        update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+    )
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(CacheVersion(name=name, version=1))
+    except IntegrityError:
+        # 并发插入时改为递增对方插入的行
+        db.session.execute(
+            update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1)
+        )
@@ -0,0 +1,328 @@
+"""
+病虫害识别推理引擎
+
+每个 gunicorn worker 在启动时加载一次模型并常驻内存，请求路径上只做前向计算。
+后端可插拔：
+- numpy: 纯 NumPy 参考实现（.npz 权重），用于测试和无依赖部署
+- onnx: onnxruntime CPU 会话（可选依赖）
+- torchscript: torch.jit 模型（可选依赖）
+"""
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from services.metrics import Distribution
+from services.preprocess import DEFAULT_DISPLAY_SIZE, ImagePreprocessor
+
+DEFAULT_MEAN = (0.485, 0.456, 0.406)
+DEFAULT_STD = (0.229, 0.224, 0.225)
+MAX_CANDIDATES = 5
+
+
+class ModelNotLoadedError(RuntimeError):
+    """模型未加载时抛出"""
+
+
+@dataclass
+class Prediction:
+    disease_name: str
+    confidence: float  # 百分比，0-100
+    probabilities: np.ndarray = field(repr=False, default=None)
+    phash: str | None = None  # 输入图片的感知哈希（若已计算）
+    model_version: str | None = None  # 产生该结果的模型版本
+    hotspots: list | None = None  # 分块识别时得分最高的区域
+    candidates: list | None = None  # 按置信度降序的前 MAX_CANDIDATES 个 {diseaseName, confidence}
+
+
+def top_candidates(probabilities: np.ndarray, labels: list[str], k: int = MAX_CANDIDATES) -> list[dict]:
+    """按概率取前 k 个类别"""
+    order = np.argsort(-probabilities)[:k]
+    return [{'diseaseName': labels[i], 'confidence': round(float(probabilities[i]) * 100, 2)} for i in order]
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    """按行计算 softmax（数值稳定）"""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def file_fingerprint(path: str, length: int = 12) -> str:
+    """根据模型文件内容生成版本号"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def load_labels(path: str | None) -> list[str]:
+    """读取标签文件（每行一个类别名）"""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as fh:
+        return [line.strip() for line in fh if line.strip()]
+
+
+class InferenceBackend:
+    """推理后端基类：输入 (N, 3, H, W) float32，输出 (N, num_classes) logits"""
+
+    name = 'base'
+    labels: list[str] = []
+    input_size: int = 224
+    mean = DEFAULT_MEAN
+    std = DEFAULT_STD
+
+    def load(self, path: str, threads: int = 1):
+        raise NotImplementedError
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class NumpyBackend(InferenceBackend):
+    """纯 NumPy 参考后端：网格平均池化 + 线性分类层
+
+    .npz 文件字段：weights (F, C)、bias (C,)、labels (C,)，
+    可选 grid、input_size、mean、std。
+    """
+
+    name = 'numpy'
+
+    def load(self, path: str, threads: int = 1):
+        with np.load(path, allow_pickle=False) as data:
+            self.load_metadata(data)
+            self.weights = np.ascontiguousarray(data['weights'], dtype=np.float32)
+        self.validate()
+
+    def load_metadata(self, data):
+        self.bias = np.ascontiguousarray(data['bias'], dtype=np.float32)
+        self.labels = [str(label) for label in data['labels']]
+        self.grid = int(data['grid']) if 'grid' in data else 4
+        self.input_size = int(data['input_size']) if 'input_size' in data else 224
+        if 'mean' in data:
+            self.mean = tuple(float(v) for v in data['mean'])
+        if 'std' in data:
+            self.std = tuple(float(v) for v in data['std'])
+
+    def validate(self):
+        if self.input_size % self.grid:
+            raise ValueError('input_size must be divisible by grid')
+        expected = 3 * self.grid * self.grid
+        if self.weights.shape != (expected, len(self.labels)):
+            raise ValueError(
+                f'weights shape {self.weights.shape} does not match '
+                f'({expected}, {len(self.labels)})'
+            )
+
+    def features(self, batch: np.ndarray) -> np.ndarray:
+        n, c, h, w = batch.shape
+        g = self.grid
+        pooled = batch.reshape(n, c, g, h // g, g, w // g).mean(axis=(3, 5))
+        return pooled.reshape(n, c * g * g)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.features(batch) @ self.weights + self.bias
+
+
+class OnnxBackend(InferenceBackend):
+    """onnxruntime CPU 后端"""
+
+    name = 'onnx'
+
+    def load(self, path: str, threads: int = 1):
+        try:
+            import onnxruntime as ort
+        except ImportError as exc:
+            raise RuntimeError('onnxruntime is not installed') from exc
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        if isinstance(model_input.shape[-1], int):
+            self.input_size = model_input.shape[-1]
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TorchScriptBackend(InferenceBackend):
+    """TorchScript CPU 后端"""
+
+    name = 'torchscript'
+
+    def load(self, path: str, threads: int = 1):
+        try:
+            import torch
+        except ImportError as exc:
+            raise RuntimeError('torch is not installed') from exc
+
+        torch.set_num_threads(threads)
+        self.torch = torch
+        self.module = torch.jit.load(path, map_location='cpu').eval()
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        with self.torch.inference_mode():
+            return self.module(self.torch.from_numpy(batch)).numpy()
+
+
+BACKENDS = {
+    NumpyBackend.name: NumpyBackend,
+    OnnxBackend.name: OnnxBackend,
+    TorchScriptBackend.name: TorchScriptBackend,
+}
+
+
+# int8 模式下各后端对应的量化后端；onnx 的量化模型仍由 onnxruntime 执行（QDQ 整数算子）。
+# NumPy 没有整数 GEMM，int8 权重只能换回浮点计算，没有速度收益只多出量化误差，因此不支持
+INT8_BACKENDS = {
+    OnnxBackend.name: OnnxBackend.name,
+}
+
+
+def quantized_path(path: str) -> str:
+    """模型文件对应的 int8 版本路径：model.npz -> model.int8.npz"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.int8{ext}'
+
+
+class InferenceEngine:
+    """常驻内存的模型会话，线程安全地执行前向计算"""
+
+    def __init__(self, backend: InferenceBackend, model_version: str,
+                 display_size: int = DEFAULT_DISPLAY_SIZE, precision: str = 'fp32'):
+        self.backend = backend
+        self.model_version = model_version
+        self.precision = precision
+        self.labels = backend.labels
+        self.input_size = backend.input_size
+        self.preprocessor = ImagePreprocessor(backend.input_size, backend.mean, backend.std, display_size)
+        # onnxruntime 会话本身可并发，但 NumPy/Torch 后端共享缓冲区，统一串行化更稳妥
+        self._lock = threading.Lock()
+        self.loaded_at = time.time()
+        self.forward_ms = Distribution()
+        self.images = 0
+
+    @classmethod
+    def load(cls, backend_name: str, model_path: str, labels_path: str | None = None,
+             threads: int = 1, model_version: str | None = None,
+             display_size: int = DEFAULT_DISPLAY_SIZE, precision: str = 'fp32'):
+        """precision='int8' 时加载同目录下 quantize_model.py 生成的 *.int8.* 模型"""
+        if precision == 'int8':
+            if backend_name not in INT8_BACKENDS:
+                raise ValueError(f'int8 precision is not supported by the {backend_name} backend')
+            backend_name = INT8_BACKENDS[backend_name]
+            model_path = quantized_path(model_path)
+            # 量化模型的结果与浮点模型不同，版本号区分开，缓存不会混用
+            if model_version:
+                model_version = f'{model_version}+int8'
+        elif precision != 'fp32':
+            raise ValueError(f'Unknown model precision: {precision}')
+
+        backend_cls = BACKENDS.get(backend_name)
+        if backend_cls is None:
+            raise ValueError(f'Unknown inference backend: {backend_name}')
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(model_path)
+
+        backend = backend_cls()
+        backend.load(model_path, threads=threads)
+        labels = load_labels(labels_path)
+        if labels:
+            backend.labels = labels
+        if not backend.labels:
+            raise ValueError('Model has no class labels')
+        return cls(backend, model_version or file_fingerprint(model_path), display_size, precision)
+
+    def image_to_tensor(self, source: bytes | str) -> np.ndarray:
+        """解码图片（字节或文件路径）并转换为 (3, S, S) 的归一化 float32 张量"""
+        image, _ = self.preprocessor.decode(source)
+        return self.preprocessor.to_tensor(image)
+
+    def predict_batch(self, batch: np.ndarray) -> list[Prediction]:
+        """对 (N, 3, S, S) 张量执行一次前向计算"""
+        with self._lock:
+            started = time.perf_counter()
+            logits = self.backend.forward(np.ascontiguousarray(batch, dtype=np.float32))
+            self.forward_ms.observe((time.perf_counter() - started) * 1000)
+            self.images += len(batch)
+        probs = softmax(np.asarray(logits, dtype=np.float32))
+        top = probs.argmax(axis=1)
+        return [
+            Prediction(
+                disease_name=self.labels[idx],
+                confidence=round(float(probs[i, idx]) * 100, 2),
+                probabilities=probs[i],
+                model_version=self.model_version,
+                candidates=top_candidates(probs[i], self.labels),
+            )
+            for i, idx in enumerate(top)
+        ]
+
+    def predict_images(self, images: list[bytes]) -> list[Prediction]:
+        batch = np.stack([self.image_to_tensor(b) for b in images])
+        return self.predict_batch(batch)
+
+    def predict(self, image_bytes: bytes) -> Prediction:
+        return self.predict_images([image_bytes])[0]
+
+    def stats(self) -> dict:
+        return {
+            'version': self.model_version,
+            'backend': self.backend.name,
+            'precision': self.precision,
+            'loadedAt': self.loaded_at,
+            'images': self.images,
+            'forwardMs': self.forward_ms.snapshot(),
+        }
+
+
+_engine: InferenceEngine | None = None
+_engine_error: str | None = None
+
+
+def set_engine(engine: InferenceEngine):
+    """原子替换当前 worker 的活动引擎；正在使用旧引擎的请求不受影响"""
+    global _engine, _engine_error
+    _engine = engine
+    _engine_error = None
+
+
+def init_engine(app):
+    """按 MODEL_PATH 加载单个模型；失败时记录错误，识别接口返回 503"""
+    global _engine, _engine_error
+    config = app.config
+    try:
+        _engine = InferenceEngine.load(
+            config['MODEL_BACKEND'],
+            config['MODEL_PATH'],
+            labels_path=config.get('MODEL_LABELS_PATH'),
+            threads=config.get('INFERENCE_THREADS', 1),
+            model_version=config.get('MODEL_VERSION'),
+            display_size=config.get('PREPROCESS_DISPLAY_SIZE', DEFAULT_DISPLAY_SIZE),
+            precision=config.get('MODEL_PRECISION', 'fp32'),
+        )
+        _engine_error = None
+        app.logger.info('Loaded %s model %s (version %s)', _engine.backend.name,
+                        config['MODEL_PATH'], _engine.model_version)
+    except Exception as exc:
+        _engine = None
+        _engine_error = str(exc)
+        app.logger.warning('Recognition model not loaded: %s', exc)
+    return _engine
+
+
+def get_engine() -> InferenceEngine:
+    """获取当前 worker 的常驻推理引擎"""
+    if _engine is None:
+        raise ModelNotLoadedError(_engine_error or 'Recognition model is not loaded')
+    return _engine
@@ -0,0 +1,239 @@
+"""
+异步识别任务
+
+POST /api/recognize?async=1 保存展示图、把原图移入 JOB_STAGING_FOLDER 并写入一条 recognition_jobs 记录，
+随即返回 202；本地进程池在原图上执行推理（与同步识别的输入和缓存键一致）并写入结果。无需外部消息中间件：
+- local: 每个 gunicorn worker 启动自己的进程池，任务 id 通过 multiprocessing 队列下发；
+  内存队列随进程退出丢失，worker 启动时从表中接手 pending 的任务
+- database: 进程池轮询 recognition_jobs 表，用条件 UPDATE 抢占任务，
+  可以由 job_worker.py 在 gunicorn 之外单独运行，重启后未完成的任务会被继续处理
+"""
+
+import multiprocessing
+import os
+import queue
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+
+WORKER_ENV = 'AIRICEPEST_JOB_WORKER'
+
+_queue = None
+_processes: list = []
+
+
+def is_job_worker() -> bool:
+    return os.environ.get(WORKER_ENV) == '1'
+
+
+def claim_job(job_id: str) -> bool:
+    """把任务从 pending 改为 running；返回 False 表示已被其他进程抢占"""
+    from models import db, RecognitionJob
+
+    result = db.session.execute(
+        update(RecognitionJob)
+        .where(RecognitionJob.id == job_id, RecognitionJob.status == 'pending')
+        .values(status='running', started_at=datetime.now(timezone.utc))
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def next_pending_job() -> str | None:
+    """按创建时间取出并抢占下一条待处理任务"""
+    from models import RecognitionJob
+
+    while True:
+        row = (
+            RecognitionJob.query.with_entities(RecognitionJob.id)
+            .filter_by(status='pending')
+            .order_by(RecognitionJob.created_at, RecognitionJob.id)
+            .first()
+        )
+        if row is None:
+            return None
+        if claim_job(row.id):
+            return row.id
+
+
+def original_path(app, job_id: str) -> str:
+    """任务原图的暂存路径"""
+    return os.path.join(app.config['JOB_STAGING_FOLDER'], job_id)
+
+
+def stage_original(app, job_id: str, path: str):
+    """把请求暂存的原图移入任务暂存目录，由执行任务的进程读取"""
+    os.makedirs(app.config['JOB_STAGING_FOLDER'], exist_ok=True)
+    shutil.move(path, original_path(app, job_id))
+
+
+def discard_original(app, job_id: str):
+    path = original_path(app, job_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def requeue_stale_jobs(timeout: float) -> int:
+    """把开始执行超过 timeout 秒仍为 running 的任务改回 pending（执行它的进程已退出），返回任务数"""
+    from models import db, RecognitionJob
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=timeout)
+    result = db.session.execute(
+        update(RecognitionJob)
+        .where(RecognitionJob.status == 'running', RecognitionJob.started_at < cutoff)
+        .values(status='pending', started_at=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def pending_job_ids() -> list[str]:
+    from models import RecognitionJob
+
+    rows = (
+        RecognitionJob.query.with_entities(RecognitionJob.id)
+        .filter_by(status='pending')
+        .order_by(RecognitionJob.created_at, RecognitionJob.id)
+        .all()
+    )
+    return [row.id for row in rows]
+
+
+def run_job(job_id: str):
+    """执行已抢占的任务：读取原图、推理、写入识别结果，结束后删除暂存的原图"""
+    from flask import current_app
+
+    from models import db, RecognitionJob, User
+    from services.inference import get_engine
+    from services.model_registry import get_model_registry
+    from services.recognition import lookup_prediction, remember_prediction, save_recognition
+    from services.upload_store import get_upload_store
+
+    job = RecognitionJob.query.get(job_id)
+    if job is None:
+        return
+    try:
+        image_path = original_path(current_app, job.id)
+        if not os.path.isfile(image_path):
+            # 提交时引用已上传图片（imageUrl）的任务没有暂存原图
+            image_path = get_upload_store().resolve(job.image_url)
+        if not image_path:
+            raise FileNotFoundError(f'Uploaded image missing: {job.image_url}')
+        engine = get_engine()
+        digest, prepared, prediction = lookup_prediction(engine, image_path)
+        if prediction is None:
+            prediction = engine.predict_batch(prepared.tensor[None])[0]
+            remember_prediction(engine, digest, prepared.phash, prediction)
+            get_model_registry().maybe_shadow(prepared, prediction)
+        user = User.query.get(job.user_id) if job.user_id else None
+        save_recognition(job.id, user, job.image_url, prediction)
+        job.status = 'done'
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        job = RecognitionJob.query.get(job_id)
+        job.status = 'failed'
+        job.error = str(exc)
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+    discard_original(current_app, job_id)
+
+
+def _worker_main(job_queue, backend: str, poll_interval: float, running_timeout: float):
+    """进程池中每个子进程的主循环（在子进程内加载 app 和模型）"""
+    os.environ[WORKER_ENV] = '1'
+    from app import app
+    from models import db
+    from services.model_registry import init_model_registry
+
+    # 导入 app 不会预热，子进程只加载推理所需的模型
+    init_model_registry(app)
+    with app.app_context():
+        if backend == 'database':
+            requeue_stale_jobs(running_timeout)
+        while True:
+            if backend == 'database':
+                job_id = next_pending_job()
+                if job_id is None:
+                    db.session.remove()
+                    time.sleep(poll_interval)
+                    continue
+            else:
+                try:
+                    job_id = job_queue.get(timeout=poll_interval)
+                except queue.Empty:
+                    continue
+                if not claim_job(job_id):
+                    continue
+            run_job(job_id)
+            db.session.remove()
+
+
+def start_workers(backend: str, workers: int, poll_interval: float = 1.0, running_timeout: float = 600.0):
+    """启动进程池（spawn 方式，避免 fork 复制模型会话和数据库连接）
+
+    database 模式下子进程启动时先把超时的 running 任务改回 pending。
+    """
+    global _queue
+    ctx = multiprocessing.get_context('spawn')
+    _queue = ctx.Queue() if backend == 'local' else None
+    for i in range(workers):
+        proc = ctx.Process(
+            target=_worker_main,
+            args=(_queue, backend, poll_interval, running_timeout),
+            name=f'recognition-job-{i}',
+            daemon=True,
+        )
+        proc.start()
+        _processes.append(proc)
+    return _processes
+
+
+def accepts_jobs(app) -> bool:
+    """提交的任务是否有进程执行：database 模式由 job_worker.py 轮询，local 模式需要 JOB_WORKERS > 0"""
+    return app.config.get('JOB_QUEUE_BACKEND', 'local') != 'local' or app.config.get('JOB_WORKERS', 1) > 0
+
+
+def ensure_workers(app):
+    """首次提交任务时在当前 gunicorn worker 中启动进程池
+
+    延迟到首次使用，避免迁移脚本等导入 app 时也拉起子进程；任务子进程自身不再启动。
+    """
+    if is_job_worker() or _processes:
+        return
+    workers = app.config.get('JOB_WORKERS', 1)
+    if workers <= 0:
+        return
+    start_workers(app.config.get('JOB_QUEUE_BACKEND', 'local'), workers,
+                  app.config.get('JOB_POLL_INTERVAL', 1.0), app.config.get('JOB_RUNNING_TIMEOUT', 600.0))
+
+
+def resume_jobs(app) -> int:
+    """local 模式下 worker 启动时接手上次退出前未完成的任务，返回重新下发的任务数
+
+    超时的 running 任务改回 pending，所有 pending 任务 id 放入本 worker 的队列；
+    多个 worker 重复下发同一任务时由 claim_job 保证只执行一次。
+    """
+    if is_job_worker() or app.config.get('JOB_QUEUE_BACKEND', 'local') != 'local':
+        return 0
+    with app.app_context():
+        requeue_stale_jobs(app.config.get('JOB_RUNNING_TIMEOUT', 600.0))
+        job_ids = pending_job_ids()
+    if not job_ids:
+        return 0
+    ensure_workers(app)
+    if _queue is None:
+        return 0
+    for job_id in job_ids:
+        _queue.put(job_id)
+    return len(job_ids)
+
+
+def enqueue(app, job_id: str):
+    """提交任务；database 模式下由轮询发现，无需通过队列通知"""
+    ensure_workers(app)
+    if _queue is not None:
+        _queue.put(job_id)
@@ -0,0 +1,345 @@
+"""
+知识库的进程内快照
+
+知识库只在管理员编辑时变化，因此每个 worker 持有一份完整快照：
+- 所有条目按接口结构预先序列化，按 pest_id、分类建立索引，名称和别名编译为 NameResolver（支持模糊匹配）
+- 列表接口按 (分类, 页码, 每页条数) 缓存编码好的 JSON 字节，默认每页条数的所有页在构建时预先编码
+- 列表接口支持字段投影（?fields= 或 view=summary），投影后的字节同样按参数缓存
+- 单条接口的响应字节也预先编码
+- 每份响应字节附带由内容计算的强 ETag，某一页或某一条没有变化时 ETag 不变，客户端可以用 If-None-Match 得到 304
+
+管理员增删改在同一事务内递增 cache_versions 表中的 knowledge 计数器，当前 worker 提交后立即重建；
+其他 worker 每隔 KNOWLEDGE_VERSION_CHECK_INTERVAL 秒比较一次计数器，不一致时重建。
+直接用 SQL 修改数据（例如导入 seed.sql）不会递增计数器，快照最长 KNOWLEDGE_SNAPSHOT_MAX_AGE 秒后重建。
+
+全文检索索引（services/knowledge_search.py）由 store 持有并跨快照复用：重建时只对内容变化的条目重新切词；
+管理员修改单条记录后用 apply() 只读取这一行。
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from models import KnowledgeBase
+from services.cache_versions import bump_version, read_version
+from services.knowledge_search import SearchIndex, search_fields
+from services.name_resolver import NameMatch, NameResolver, normalize_name
+from services.pagination import encode_cursor
+
+VERSION_NAME = 'knowledge'
+ALL_CATEGORIES = '全部'
+DEFAULT_PAGE_SIZE = 100
+MAX_CACHED_PAYLOADS = 512
+
+# 可投影的字段：serialize_knowledge 的键，加上派生的 imageUrl（第一张图片）
+KNOWLEDGE_FIELDS = (
+    'id', 'category', 'name', 'type', 'aliases', 'keyFeatures', 'affectedParts', 'imageUrls', 'imageUrl',
+    'pathogen', 'conditions', 'lifeCycle', 'transmission', 'controls',
+)
+VIEWS = {
+    'summary': ('id', 'category', 'name', 'imageUrl'),
+}
+
+
+def split_to_array(value):
+    """将文本分割为数组（支持多种分隔符）"""
+    if not value:
+        return []
+    return [item.strip() for item in value.replace('；', ';').replace('、', ',').split(';') if item.strip()]
+
+
+def comma_separated(value):
+    """将逗号分隔的字符串转为数组"""
+    if not value:
+        return []
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def serialize_knowledge(item) -> dict:
+    """把 KnowledgeBase 记录转换为接口返回的结构"""
+    return {
+        'id': str(item.pest_id),
+        'category': item.category,
+        'name': item.disease_name,
+        'type': item.type_info or '',
+        'aliases': split_to_array(item.alias_names),
+        'keyFeatures': item.core_features or '',
+        'affectedParts': split_to_array(item.affected_parts),
+        'imageUrls': comma_separated(item.symptom_images),
+        'pathogen': item.pathogen_source or '',
+        'conditions': item.occurrence_conditions or '',
+        'lifeCycle': item.generations_periods or '',
+        'transmission': item.transmission_routes or '',
+        'controls': {
+            'agricultural': split_to_array(item.agricultural_control),
+            'physical': split_to_array(item.physical_control),
+            'biological': split_to_array(item.biological_control),
+            'chemical': split_to_array(item.chemical_control),
+        }
+    }
+
+
+def parse_fields(fields: str | None, view: str | None = None) -> tuple[str, ...] | None:
+    """解析 ?fields=a,b 或 view=summary，返回按固定顺序排列的字段元组；None 表示全部字段
+
+    未知字段或视图抛出 ValueError。
+    """
+    if view:
+        if view not in VIEWS:
+            raise ValueError(f"Unknown view '{view}', expected one of: {', '.join(VIEWS)}")
+        return VIEWS[view]
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(',') if f.strip()}
+    unknown = sorted(requested - set(KNOWLEDGE_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(f for f in KNOWLEDGE_FIELDS if f in requested) or None
+
+
+def project(item: dict, fields: tuple[str, ...] | None) -> dict:
+    """只保留请求的字段"""
+    if fields is None:
+        return item
+    return {
+        f: (item['imageUrls'][0] if item['imageUrls'] else None) if f == 'imageUrl' else item[f]
+        for f in fields
+    }
+
+
+def encode_json(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def payload_etag(payload: bytes) -> str:
+    """响应字节的强 ETag（不含引号）"""
+    return hashlib.sha256(payload).hexdigest()[:20]
+
+
+class KnowledgeSnapshot:
+    """某一版本知识库的只读快照"""
+
+    def __init__(self, version: int, items: list[dict], index: SearchIndex | None = None):
+        self.version = version
+        self.items = items
+        self.index = index
+        self.built_at = time.time()
+        self.by_id = {int(item['id']): item for item in items}
+        self.resolver = NameResolver(items)
+        self.by_category = {}
+        for item in items:
+            self.by_category.setdefault(item['category'], []).append(item)
+
+        self.item_payloads = {
+            pest_id: encode_json({'success': True, 'data': item}) for pest_id, item in self.by_id.items()
+        }
+        self.item_etags = {pest_id: payload_etag(payload) for pest_id, payload in self.item_payloads.items()}
+        # 内容摘要：计数器相同但数据被直接修改时也能区分
+        self.digest = hashlib.sha256(b'\n'.join(self.item_payloads[k] for k in sorted(self.item_payloads))).hexdigest()[:16]
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+        for category in [None, *self.by_category]:
+            for start in range(0, max(1, len(self.filter(category))), DEFAULT_PAGE_SIZE):
+                for fields in (None, *VIEWS.values()):
+                    self.list_payload(category, start, DEFAULT_PAGE_SIZE, fields)
+
+    def filter(self, category: str | None) -> list[dict]:
+        if not category or category == ALL_CATEGORIES:
+            return self.items
+        return self.by_category.get(category, [])
+
+    def cursor_start(self, category: str | None, cursor: list) -> int:
+        """游标 [分类, pest_id] 之后第一条的下标
+
+        游标指向的条目仍在时直接定位；已被删除时取同分类中 pest_id 更大的第一条，
+        分类也已不存在时按字符串顺序近似定位（数据库排序规则可能与之不同）。
+        """
+        items = self.filter(category)
+        cursor_category, cursor_id = cursor
+        item = self.by_id.get(cursor_id)
+        if item is not None and item['category'] == cursor_category:
+            try:
+                return items.index(item) + 1
+            except ValueError:
+                pass
+        for i, item in enumerate(items):
+            if item['category'] == cursor_category and int(item['id']) > cursor_id:
+                return i
+        for i, item in enumerate(items):
+            if item['category'] > cursor_category:
+                return i
+        return len(items)
+
+    def list_payload(self, category: str | None, start: int, limit: int,
+                     fields: tuple[str, ...] | None = None) -> tuple[bytes, str, str | None]:
+        """列表接口从下标 start 起 limit 条的 (响应字节, ETag, 下一页游标)
+
+        按参数和投影字段缓存，最多 MAX_CACHED_PAYLOADS 组。
+        """
+        if not category or category == ALL_CATEGORIES:
+            category = None
+        start, limit = max(start, 0), max(limit, 0)
+        key = (category, start, limit, fields)
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is not None:
+                self._payloads.move_to_end(key)
+                return entry
+        items = self.filter(category)
+        page = items[start:start + limit]
+        payload = encode_json([project(item, fields) for item in page])
+        next_cursor = encode_cursor([page[-1]['category'], int(page[-1]['id'])]) \
+            if page and start + limit < len(items) else None
+        entry = (payload, payload_etag(payload), next_cursor)
+        with self._lock:
+            self._payloads[key] = entry
+            while len(self._payloads) > MAX_CACHED_PAYLOADS:
+                self._payloads.popitem(last=False)
+        return entry
+
+
+class KnowledgeStore:
+    """持有当前快照，并按版本计数器在各 worker 间收敛"""
+
+    def __init__(self, check_interval: float = 2.0, max_age: float = 300.0):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.rebuilds = 0
+        self.index = SearchIndex()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._build_lock = threading.Lock()
+
+    def rebuild(self) -> KnowledgeSnapshot:
+        """读取计数器和全部条目，构建新快照并替换（需在 app context 中调用）"""
+        with self._build_lock:
+            version = read_version(VERSION_NAME)
+            rows = KnowledgeBase.query.order_by(KnowledgeBase.category, KnowledgeBase.pest_id).all()
+            items = [serialize_knowledge(row) for row in rows]
+            self.index.sync(items)
+            return self._replace(KnowledgeSnapshot(version, items, self.index))
+
+    def apply(self, pest_id: int) -> KnowledgeSnapshot:
+        """管理员修改单条记录并提交后调用：只读取这一行并更新快照和检索索引
+
+        计数器不是恰好前进一步（期间有其他 worker 的修改）、新增条目或分类变化（需要按数据库顺序重新排序）时整体重建。
+        """
+        with self._build_lock:
+            current = self._snapshot
+            version = read_version(VERSION_NAME)
+            row = KnowledgeBase.query.get(pest_id)
+            old = current.by_id.get(pest_id) if current else None
+            incremental = (
+                current is not None and version == current.version + 1 and old is not None
+                and (row is None or row.category == old['category'])
+            )
+            if incremental:
+                if row is None:
+                    items = [item for item in current.items if item is not old]
+                    self.index.remove(pest_id)
+                else:
+                    new = serialize_knowledge(row)
+                    items = [new if item is old else item for item in current.items]
+                    self.index.add(pest_id, search_fields(new))
+                return self._replace(KnowledgeSnapshot(version, items, self.index))
+        return self.rebuild()
+
+    def _replace(self, snapshot: KnowledgeSnapshot) -> KnowledgeSnapshot:
+        self._snapshot = snapshot
+        self._checked_at = time.time()
+        self.rebuilds += 1
+        return snapshot
+
+    def snapshot(self) -> KnowledgeSnapshot:
+        """返回当前快照；到了检查间隔时比较计数器，落后时重建"""
+        current = self._snapshot
+        if current is None:
+            return self.rebuild()
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return current
+        # 其他线程正在检查或重建时直接使用旧快照
+        if not self._build_lock.acquire(blocking=False):
+            return current
+        try:
+            self._checked_at = now
+            stale = now - current.built_at >= self.max_age or read_version(VERSION_NAME) != current.version
+        except Exception:
+            # 数据库暂时不可用时继续使用旧快照
+            stale = False
+        finally:
+            self._build_lock.release()
+        if not stale:
+            return current
+        try:
+            return self.rebuild()
+        except Exception:
+            return current
+
+    def search(self, query: str, limit: int = 20) -> tuple[int, list[dict]]:
+        """全文检索，返回 (命中总数, 结果)；结果为完整条目加 score 和 highlights"""
+        snapshot = self.snapshot()
+        total, hits = self.index.search(query, limit)
+        results = []
+        for hit in hits:
+            item = snapshot.by_id.get(hit['id'])
+            if item is not None:
+                results.append({**item, 'score': hit['score'], 'highlights': hit['highlights']})
+        return total, results
+
+    def resolve(self, disease_name: str | None, fuzzy: bool = True,
+                labels: list[str] = ()) -> tuple[dict | None, NameMatch | None]:
+        """按病害名称或别名查找条目，返回 (条目, 匹配信息)
+
+        fuzzy 时精确未命中再容忍少量错别字；disease_name 本身是 labels（模型标签）中的
+        一个时只做精确匹配，不会把一种病害近似到另一种上。
+        """
+        snapshot = self.snapshot()
+        if fuzzy and labels:
+            key = normalize_name(disease_name)
+            fuzzy = not any(normalize_name(label) == key for label in labels)
+        match = snapshot.resolver.resolve(disease_name, fuzzy=fuzzy)
+        if match is None:
+            return None, None
+        return snapshot.by_id.get(match.pest_id), match
+
+    def get(self, disease_name: str | None) -> dict | None:
+        """按病害名称或别名精确查找条目"""
+        return self.resolve(disease_name, fuzzy=False)[0]
+
+    def changed(self):
+        """管理员修改知识库后调用：在提交前递增计数器"""
+        bump_version(VERSION_NAME)
+
+    def stats(self) -> dict:
+        current = self._snapshot
+        return {
+            'version': current.version if current else None,
+            'digest': current.digest if current else None,
+            'items': len(current.items) if current else 0,
+            'builtAt': current.built_at if current else None,
+            'rebuilds': self.rebuilds,
+            'indexedItems': len(self.index),
+            'tokenizedItems': self.index.tokenized,
+        }
+
+
+_store: KnowledgeStore | None = None
+
+
+def init_knowledge_store(app):
+    global _store
+    _store = KnowledgeStore(
+        check_interval=app.config.get('KNOWLEDGE_VERSION_CHECK_INTERVAL', 2.0),
+        max_age=app.config.get('KNOWLEDGE_SNAPSHOT_MAX_AGE', 300.0),
+    )
+    return _store
+
+
+def get_knowledge_store() -> KnowledgeStore:
+    global _store
+    if _store is None:
+        _store = KnowledgeStore()
+    return _store
@@ -0,0 +1,198 @@
+"""
+知识库全文检索 — 内存倒排索引
+
+中文不做分词：连续汉字切成字符二元组（同时索引单字，便于单字查询），字母数字按小写单词切分。
+字段按重要程度加权（名称 > 别名 > 特征/部位 > 防治措施），按 BM25 打分，并返回带 <em> 标记的高亮片段。
+
+索引与知识库快照共用：sync() 比较每个条目的字段文本，只对新增、修改、删除的条目重新切词，
+管理员修改单条记录时不会重新切分整张表。
+"""
+
+import html
+import math
+import re
+import threading
+
+# 字段名 -> 权重
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'aliases': 2.5,
+    'keyFeatures': 1.0,
+    'affectedParts': 1.0,
+    'controls': 0.5,
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 60
+
+_TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+')
+
+
+def _is_cjk(run: str) -> bool:
+    return '\u3400' <= run[0] <= '\u9fff'
+
+
+def tokenize(text: str) -> list[str]:
+    """索引用切词：汉字串产出单字和二元组，字母数字产出小写单词"""
+    tokens = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def query_terms(query: str) -> list[str]:
+    """查询用切词：两个字以上的汉字串只用二元组，单字才用单字"""
+    terms = []
+    for run in _TOKEN_RE.findall((query or '').lower()):
+        if _is_cjk(run) and len(run) > 1:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return list(dict.fromkeys(terms))
+
+
+def search_fields(item: dict) -> dict[str, str]:
+    """从序列化后的知识库条目中取出参与检索的字段文本"""
+    controls = item.get('controls') or {}
+    return {
+        'name': item.get('name') or '',
+        'aliases': '、'.join(item.get('aliases') or []),
+        'keyFeatures': item.get('keyFeatures') or '',
+        'affectedParts': '、'.join(item.get('affectedParts') or []),
+        'controls': '；'.join(
+            text for key in ('agricultural', 'physical', 'biological', 'chemical') for text in controls.get(key) or []
+        ),
+    }
+
+
+def highlight(text: str, terms: list[str], snippet_chars: int = SNIPPET_CHARS) -> str | None:
+    """用 <em> 标出命中的词；长文本截取第一个命中附近的片段。未命中返回 None"""
+    lowered = text.lower()
+    spans = []
+    for term in terms:
+        start = lowered.find(term)
+        while start != -1:
+            spans.append((start, start + len(term)))
+            start = lowered.find(term, start + 1)
+    if not spans:
+        return None
+    spans.sort()
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    left, right = 0, len(text)
+    if len(text) > snippet_chars:
+        left = max(0, merged[0][0] - snippet_chars // 4)
+        right = min(len(text), left + snippet_chars)
+    parts, cursor = [], left
+    for start, end in merged:
+        if start >= right:
+            break
+        start, end = max(start, left), min(end, right)
+        parts.append(html.escape(text[cursor:start]))
+        parts.append(f'<em>{html.escape(text[start:end])}</em>')
+        cursor = end
+    parts.append(html.escape(text[cursor:right]))
+    return ('…' if left > 0 else '') + ''.join(parts) + ('…' if right < len(text) else '')
+
+
+class SearchIndex:
+    """按 pest_id 增量维护的倒排索引"""
+
+    def __init__(self):
+        self._postings: dict[str, dict[int, float]] = {}
+        self._doc_terms: dict[int, dict[str, float]] = {}
+        self._doc_length: dict[int, float] = {}
+        self._fields: dict[int, dict[str, str]] = {}
+        self._total_length = 0.0
+        self._lock = threading.RLock()
+        self.tokenized = 0
+
+    def __len__(self):
+        return len(self._fields)
+
+    def add(self, pest_id: int, fields: dict[str, str]):
+        """加入或替换一个条目"""
+        with self._lock:
+            self.remove(pest_id)
+            terms = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(fields.get(field, '')):
+                    terms[token] = terms.get(token, 0.0) + weight
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[pest_id] = tf
+            length = sum(terms.values())
+            self._doc_terms[pest_id] = terms
+            self._doc_length[pest_id] = length
+            self._fields[pest_id] = fields
+            self._total_length += length
+            self.tokenized += 1
+
+    def remove(self, pest_id: int):
+        with self._lock:
+            terms = self._doc_terms.pop(pest_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(pest_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._doc_length.pop(pest_id)
+            self._fields.pop(pest_id, None)
+
+    def sync(self, items: list[dict]) -> int:
+        """使索引与条目列表一致，只重新切分字段有变化的条目，返回变化的条目数"""
+        with self._lock:
+            changed = 0
+            seen = set()
+            for item in items:
+                pest_id = int(item['id'])
+                seen.add(pest_id)
+                fields = search_fields(item)
+                if self._fields.get(pest_id) != fields:
+                    self.add(pest_id, fields)
+                    changed += 1
+            for pest_id in [pid for pid in self._fields if pid not in seen]:
+                self.remove(pest_id)
+                changed += 1
+            return changed
+
+    def search(self, query: str, limit: int = 20) -> tuple[int, list[dict]]:
+        """返回 (命中总数, 前 limit 个结果)；结果含 id、score、highlights"""
+        terms = query_terms(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            count = len(self._fields)
+            if not count:
+                return 0, []
+            avg_length = self._total_length / count or 1.0
+            scores: dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for pest_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_length[pest_id] / avg_length)
+                    scores[pest_id] = scores.get(pest_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+            results = []
+            for pest_id, score in ranked[:max(0, limit)]:
+                highlights = {}
+                for field, text in self._fields[pest_id].items():
+                    snippet = highlight(text, terms)
+                    if snippet is not None:
+                        highlights[field] = snippet
+                results.append({'id': pest_id, 'score': round(score, 4), 'highlights': highlights})
+            return len(ranked), results
@@ -0,0 +1,40 @@
+"""
+推理统计用的轻量指标
+"""
+
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class Distribution:
+    """保留最近若干个样本，用于计算分位数"""
+
+    def __init__(self, window: int = 4096):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            self.total += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = np.asarray(self._samples, dtype=np.float64)
+            count, total = self.count, self.total
+        if not samples.size:
+            return {'count': count, 'mean': 0, 'p50': 0, 'p90': 0, 'p99': 0, 'max': 0}
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        return {
+            'count': count,
+            'mean': round(total / count, 3),
+            'p50': round(float(p50), 3),
+            'p90': round(float(p90), 3),
+            'p99': round(float(p99), 3),
+            'max': round(float(samples.max()), 3),
+        }
@@ -0,0 +1,315 @@
+"""
+模型注册表 — 多版本模型、热切换与影子评估
+
+MODEL_DIR 下每个子目录是一个模型版本（目录名即版本号），包含 model.npz、model.onnx
+或 model.pt 之一，以及可选的 labels.txt。MODEL_DIR/registry.json 记录活动版本和影子版本：
+    {"active": "v2", "shadow": "v3", "shadowSampleRate": 0.1}
+管理接口原子地改写该文件；每个 worker 的后台线程发现变化后，先加载并预热新会话，
+再替换活动引擎，正在处理的请求继续使用旧会话完成。registry.json 不存在时沿用 MODEL_PATH。
+
+影子模型只在抽样的请求上、在后台线程里对同一张预处理后的图片再推理一次，
+记录延迟和与活动模型的一致率；不占用请求耗时，结果也不写入数据库。
+"""
+
+import json
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from services.inference import InferenceEngine, get_engine, init_engine, quantized_path, set_engine
+from services.phash import get_near_duplicate_index
+from services.preprocess import DEFAULT_DISPLAY_SIZE
+from services.result_cache import get_result_cache
+
+MODEL_FILES = {'model.npz': 'numpy', 'model.onnx': 'onnx', 'model.pt': 'torchscript'}
+LABELS_FILE = 'labels.txt'
+REGISTRY_FILE = 'registry.json'
+
+
+class ModelRegistry:
+    def __init__(self, model_dir: str, threads: int = 1, display_size: int = DEFAULT_DISPLAY_SIZE,
+                 poll_interval: float = 2.0, shadow_queue_size: int = 64, logger=None,
+                 precision: str = 'fp32'):
+        self.model_dir = model_dir
+        self.precision = precision
+        self.threads = threads
+        self.display_size = display_size
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self.shadow = None
+        self.shadow_rate = 0.0
+        self.shadow_dropped = 0
+        self.last_error = None
+        self.retired = {}  # 已下线版本 -> 下线时的统计
+        self._agreement = {}  # (影子版本, 活动版本) -> [比较次数, 一致次数]
+        self._state_mtime = None
+        self._lock = threading.Lock()
+        self._shadow_queue = queue.Queue(maxsize=max(1, shadow_queue_size))
+        self._threads_started = False
+
+    @classmethod
+    def from_config(cls, config, logger=None):
+        """config 为 app.config 或 vars(Config)"""
+        return cls(
+            config.get('MODEL_DIR'),
+            threads=config.get('INFERENCE_THREADS', 1),
+            display_size=config.get('PREPROCESS_DISPLAY_SIZE', DEFAULT_DISPLAY_SIZE),
+            poll_interval=config.get('MODEL_REGISTRY_POLL_INTERVAL', 2.0),
+            shadow_queue_size=config.get('SHADOW_QUEUE_SIZE', 64),
+            logger=logger,
+            precision=config.get('MODEL_PRECISION', 'fp32'),
+        )
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.model_dir, REGISTRY_FILE)
+
+    def _log(self, level: str, msg: str, *args):
+        if self.logger is not None:
+            getattr(self.logger, level)(msg, *args)
+
+    # ---- 磁盘上的版本 ----
+
+    def model_files(self, version: str) -> tuple[str, str, str | None]:
+        """返回 (后端名, 模型路径, 标签路径)；版本不存在时抛出 ValueError"""
+        if not self.model_dir or not version or os.sep in version or version.startswith('.'):
+            raise ValueError(f'Unknown model version: {version}')
+        directory = os.path.join(self.model_dir, version)
+        for filename, backend in MODEL_FILES.items():
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                labels = os.path.join(directory, LABELS_FILE)
+                return backend, path, labels if os.path.isfile(labels) else None
+        raise ValueError(f'Unknown model version: {version}')
+
+    def versions(self) -> list[dict]:
+        if not self.model_dir or not os.path.isdir(self.model_dir):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.model_dir)):
+            try:
+                backend, path, _ = self.model_files(name)
+            except ValueError:
+                continue
+            stat = os.stat(path)
+            result.append({'version': name, 'backend': backend, 'sizeBytes': stat.st_size,
+                           'modifiedAt': stat.st_mtime, 'int8': os.path.isfile(quantized_path(path))})
+        return result
+
+    def engine_version(self, version: str) -> str:
+        """注册版本在当前精度下对应的引擎版本号"""
+        return f'{version}+int8' if self.precision == 'int8' else version
+
+    def load_engine(self, version: str) -> InferenceEngine:
+        backend, path, labels = self.model_files(version)
+        engine = InferenceEngine.load(backend, path, labels_path=labels, threads=self.threads,
+                                      model_version=version, display_size=self.display_size,
+                                      precision=self.precision)
+        # 切换前先做一次前向计算，避免首个请求承担惰性初始化的开销
+        size = engine.input_size
+        engine.backend.forward(np.zeros((1, 3, size, size), dtype=np.float32))
+        return engine
+
+    # ---- registry.json ----
+
+    def read_state(self) -> dict:
+        try:
+            with open(self.state_path, encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _write_file(self, state: dict):
+        os.makedirs(self.model_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.model_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(state, fh, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def write_state(self, state: dict):
+        """原子改写 registry.json 并立即在当前 worker 生效；加载失败时恢复原文件"""
+        previous = self.read_state()
+        self._write_file(state)
+        try:
+            self.refresh(force=True, strict=True)
+        except Exception:
+            self._write_file(previous)
+            raise
+
+    def activate(self, version: str):
+        self.model_files(version)
+        state = self.read_state()
+        state['active'] = version
+        if state.get('shadow') == version:
+            state.pop('shadow')
+        self.write_state(state)
+
+    def set_shadow(self, version: str | None, sample_rate: float):
+        if version:
+            self.model_files(version)
+        state = self.read_state()
+        state['shadow'] = version or None
+        state['shadowSampleRate'] = min(max(float(sample_rate), 0.0), 1.0)
+        self.write_state(state)
+
+    # ---- 热切换 ----
+
+    def refresh(self, force: bool = False, strict: bool = False):
+        """registry.json 变化时加载新的活动/影子版本（在后台线程或管理接口中调用）
+
+        活动版本加载失败时保留当前会话，force 时抛出；影子版本加载失败只记录，strict 时才抛出
+        （管理接口据此恢复 registry.json）。
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.state_path).st_mtime_ns
+            except (OSError, TypeError):
+                return
+            if mtime == self._state_mtime and not force:
+                return
+            state = self.read_state()
+            try:
+                active = state.get('active')
+                current = self._current_engine()
+                if active and (current is None or current.model_version != self.engine_version(active)):
+                    engine = self.load_engine(active)
+                    set_engine(engine)
+                    if current is not None:
+                        self.retired[current.model_version] = current.stats()
+                        self._retire_caches(current.model_version)
+                    self._log('info', 'Activated model version %s', active)
+            except Exception as exc:
+                # 加载失败时保留当前会话，下次文件变化或强制刷新时重试
+                self.last_error = str(exc)
+                self._log('warning', 'Model registry refresh failed: %s', exc)
+                self._state_mtime = mtime
+                if force:
+                    raise
+                return
+
+            try:
+                shadow_version = state.get('shadow')
+                if not shadow_version:
+                    self._retire_shadow()
+                elif self.shadow is None or self.shadow.model_version != self.engine_version(shadow_version):
+                    engine = self.load_engine(shadow_version)
+                    self._retire_shadow()
+                    self.shadow = engine
+                    self._log('info', 'Shadowing model version %s', shadow_version)
+                self.last_error = None
+            except Exception as exc:
+                # 影子版本只用于评估，加载失败不影响活动版本和服务就绪
+                self.last_error = f'Shadow model: {exc}'
+                self._log('warning', 'Shadow model load failed: %s', exc)
+                if strict:
+                    raise
+            self.shadow_rate = float(state.get('shadowSampleRate') or 0.0) if self.shadow else 0.0
+            self._state_mtime = mtime
+
+    def _current_engine(self):
+        try:
+            return get_engine()
+        except RuntimeError:
+            return None
+
+    def _retire_caches(self, model_version: str):
+        """活动版本被替换后清理它在结果缓存和近重复索引中的条目"""
+        get_result_cache().retire(model_version)
+        get_near_duplicate_index().retire(model_version)
+
+    def _retire_shadow(self):
+        if self.shadow is not None:
+            self.retired[self.shadow.model_version] = self.shadow.stats()
+        self.shadow = None
+        self.shadow_rate = 0.0
+
+    def start(self):
+        """启动监视 registry.json 的线程和影子推理线程"""
+        if self._threads_started:
+            return
+        self._threads_started = True
+        threading.Thread(target=self._watch, name='model-registry', daemon=True).start()
+        threading.Thread(target=self._run_shadow, name='model-shadow', daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.refresh()
+
+    # ---- 影子评估 ----
+
+    def maybe_shadow(self, prepared, prediction):
+        """按抽样率把已完成的推理交给影子模型复核；队列满时直接丢弃"""
+        shadow = self.shadow
+        if shadow is None or prepared is None or random.random() >= self.shadow_rate:
+            return
+        try:
+            self._shadow_queue.put_nowait((shadow, prepared.display, prediction))
+        except queue.Full:
+            self.shadow_dropped += 1
+
+    def _run_shadow(self):
+        while True:
+            shadow, display, prediction = self._shadow_queue.get()
+            try:
+                tensor = shadow.preprocessor.to_tensor(display)
+                result = shadow.predict_batch(tensor[None])[0]
+            except Exception as exc:
+                self._log('warning', 'Shadow inference failed: %s', exc)
+                continue
+            key = (shadow.model_version, prediction.model_version)
+            with self._lock:
+                counts = self._agreement.setdefault(key, [0, 0])
+                counts[0] += 1
+                counts[1] += result.disease_name == prediction.disease_name
+
+    def stats(self) -> dict:
+        active = self._current_engine()
+        shadow = self.shadow
+        with self._lock:
+            agreement = [
+                {'shadowVersion': s, 'activeVersion': a, 'compared': compared, 'agreed': agreed,
+                 'agreementRate': round(agreed / compared, 4) if compared else 0}
+                for (s, a), (compared, agreed) in self._agreement.items()
+            ]
+        return {
+            'active': active.stats() if active else None,
+            'shadow': dict(shadow.stats(), sampleRate=self.shadow_rate,
+                           queueDepth=self._shadow_queue.qsize(), dropped=self.shadow_dropped) if shadow else None,
+            'agreement': agreement,
+            'retired': self.retired,
+            'versions': self.versions(),
+            'lastError': self.last_error,
+        }
+
+
+_registry: ModelRegistry | None = None
+
+
+def init_model_registry(app) -> ModelRegistry:
+    """加载 registry.json 指定的活动版本（不存在或加载失败时按 MODEL_PATH 加载），并启动热切换线程"""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry.from_config(app.config, logger=app.logger)
+    if _registry.read_state().get('active'):
+        try:
+            _registry.refresh(force=True)
+        except Exception as exc:
+            app.logger.warning('Falling back to MODEL_PATH: %s', exc)
+            init_engine(app)
+    else:
+        init_engine(app)
+        _registry.refresh()
+    _registry.start()
+    return _registry
+
+
+def get_model_registry() -> ModelRegistry:
+    if _registry is None:
+        raise RuntimeError('Model registry is not initialized')
+    return _registry
@@ -0,0 +1,123 @@
+"""
+病害名称解析 — 把模型标签、用户输入的名称或别名映射到知识库 pest_id
+
+所有名称和别名（alias_names 按 ；/、 拆分）归一化后编译进一棵字符 trie：
+- 精确查找沿 trie 走一遍，耗时与查询长度成正比
+- 精确未命中时在 trie 上做带剪枝的编辑距离搜索（每个节点维护一行 Levenshtein 表，
+  整行超过阈值即剪掉该子树），容忍一两个错别字或多余/缺失的字
+- 病害名称大多只有 3-4 个字，差一个字往往就是另一种病害（稻曲病/稻瘟病），4 个字以内只做精确匹配；
+  识别结果关联知识库时只用精确匹配（resolve(fuzzy=False)）
+
+随知识库快照一起构建，快照更新时整体替换。
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+
+# alias_names 拆分后仍可能用逗号或顿号连写多个别名
+_ALIAS_SEPARATOR_RE = re.compile(r'[,，、]')
+# 归一化时去掉的空白和标点
+_IGNORED_RE = re.compile(r'[\s\-_·•/\\()（）\[\]【】{}<>《》,，;；、.。:：\'"“”‘’!！?？]+')
+_TERMINAL = ''
+MAX_CACHED_LOOKUPS = 4096
+
+
+def normalize_name(text: str | None) -> str:
+    """全角转半角、小写、去掉空白和标点"""
+    return _IGNORED_RE.sub('', unicodedata.normalize('NFKC', text or '').lower())
+
+
+def split_aliases(aliases: list[str]) -> list[str]:
+    """把 split_to_array 的结果继续按逗号/顿号拆成单个别名"""
+    return [part.strip() for alias in aliases for part in _ALIAS_SEPARATOR_RE.split(alias) if part.strip()]
+
+
+def fuzzy_threshold(length: int) -> int:
+    """允许的编辑距离：4 个字以内不做模糊匹配，8 个字以内 1 处，更长 2 处"""
+    if length <= 4:
+        return 0
+    return 1 if length <= 8 else 2
+
+
+@dataclass(frozen=True)
+class NameMatch:
+    pest_id: int
+    matched: str          # 命中的原始名称或别名
+    kind: str             # name | alias
+    distance: int = 0     # 0 为精确匹配
+
+    def to_dict(self) -> dict:
+        return {'id': str(self.pest_id), 'matched': self.matched, 'kind': self.kind, 'distance': self.distance}
+
+
+class NameResolver:
+    """由知识库条目（serialize_knowledge 结构）构建的名称/别名 trie"""
+
+    def __init__(self, items: list[dict]):
+        self._root: dict = {}
+        self._cache: dict[tuple[str, int | None], NameMatch | None] = {}
+        self.names = 0
+        for item in items:
+            pest_id = int(item['id'])
+            self._insert(item['name'], NameMatch(pest_id, item['name'], 'name'))
+            for alias in split_aliases(item['aliases']):
+                self._insert(alias, NameMatch(pest_id, alias, 'alias'))
+
+    def _insert(self, text: str, match: NameMatch):
+        key = normalize_name(text)
+        if not key:
+            return
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(_TERMINAL, []).append(match)
+        self.names += 1
+
+    def exact(self, text: str | None) -> list[NameMatch]:
+        """精确匹配（归一化后）的全部条目，名称优先于别名"""
+        node = self._root
+        for char in normalize_name(text):
+            node = node.get(char)
+            if node is None:
+                return []
+        return sorted(node.get(_TERMINAL, []), key=lambda m: (m.kind != 'name', m.pest_id))
+
+    def similar(self, text: str | None, max_distance: int | None = None) -> list[NameMatch]:
+        """编辑距离不超过阈值的全部条目，按距离排序"""
+        key = normalize_name(text)
+        if not key:
+            return []
+        limit = fuzzy_threshold(len(key)) if max_distance is None else max_distance
+        found: dict[int, NameMatch] = {}
+        first_row = list(range(len(key) + 1))
+        stack = [(child, char, first_row) for char, child in self._root.items() if char != _TERMINAL]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i in range(1, len(key) + 1):
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (key[i - 1] != char)))
+            if row[-1] <= limit:
+                for match in node.get(_TERMINAL, []):
+                    best = found.get(match.pest_id)
+                    if best is None or (row[-1], match.kind != 'name') < (best.distance, best.kind != 'name'):
+                        found[match.pest_id] = NameMatch(match.pest_id, match.matched, match.kind, row[-1])
+            if min(row) <= limit:
+                stack.extend((child, c, row) for c, child in node.items() if c != _TERMINAL)
+        return sorted(found.values(), key=lambda m: (m.distance, m.kind != 'name', m.pest_id))
+
+    def resolve(self, text: str | None, max_distance: int | None = None, fuzzy: bool = True) -> NameMatch | None:
+        """解析为唯一条目：先精确匹配，fuzzy 时再模糊匹配；最近的候选不唯一时返回 None"""
+        cache_key = (text or '', max_distance, fuzzy)
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        matches = self.exact(text)
+        if not matches and fuzzy:
+            matches = self.similar(text, max_distance)
+            if len(matches) > 1 and matches[0].distance == matches[1].distance:
+                matches = []
+        match = matches[0] if matches else None
+        if len(self._cache) >= MAX_CACHED_LOOKUPS:
+            self._cache.clear()
+        self._cache[cache_key] = match
+        return match
@@ -0,0 +1,65 @@
+"""
+游标（keyset）分页 — 用上一页最后一行的排序键代替 OFFSET，翻页成本与页深无关
+
+游标对客户端不透明：排序键值 JSON 编码后做 base64url。
+列表接口在还有下一页时通过 X-Next-Cursor 响应头（包装在 data 中的接口同时返回 nextCursor）给出游标，
+客户端原样放进 ?cursor= 取下一页。
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(values: list) -> str:
+    plain = [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values]
+    raw = json.dumps(plain, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, parsers: list) -> list:
+    """按 parsers 逐个还原排序键；格式不对时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError
+        return [parse(value) for parse, value in zip(parsers, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError('Invalid cursor') from None
+
+
+def after(columns: list, values: list, descending: bool = True):
+    """排序键严格位于游标之后的条件
+
+    展开为 (a < x) OR (a = x AND b < y)，而不是行值比较，MySQL 才能在复合索引上做范围扫描。
+    """
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        beyond = column < value if descending else column > value
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], beyond))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns: list, cursor: list | None, limit: int, descending: bool = True, offset: int = 0):
+    """按 columns 排序取一页，返回 (rows, next_cursor)；没有下一页时 next_cursor 为 None
+
+    columns 为排序列（最后一列须唯一），cursor 为 decode_cursor 的结果。
+    offset 仅用于兼容旧的页码参数（没有游标时）。
+    """
+    order = [column.desc() if descending else column.asc() for column in columns]
+    query = query.order_by(*order)
+    if cursor is not None:
+        query = query.filter(after(columns, cursor, descending))
+    elif offset > 0:
+        query = query.offset(offset)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], column.key) for column in columns])
@@ -0,0 +1,182 @@
+"""
+感知哈希（dHash）与 BK 树近重复检索
+
+不同手机应用重新编码或轻微裁剪过的同一张叶片照片，字节哈希不同但 dHash
+的汉明距离很小。识别时在 BK 树中查找阈值内最近的已识别图片并复用其结果；
+管理端用同一结构快速找出重复图片簇。
+"""
+
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+def dhash_image(img: Image.Image, hash_size: int = HASH_SIZE) -> str:
+    """计算已解码图片的 64 位差值哈希，返回 16 位十六进制字符串"""
+    gray = img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return np.packbits(bits).tobytes().hex()
+
+
+def dhash(source: bytes | str, hash_size: int = HASH_SIZE) -> str:
+    """从字节或文件路径计算差值哈希"""
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        # JPEG 可按比例直接解码缩略图，避免完整解码大图
+        img.draft('L', (hash_size * 16, hash_size * 16))
+        return dhash_image(img, hash_size)
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """以汉明距离为度量的 BK 树，节点为 [hash, payload, {distance: child}]"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, phash: str, payload):
+        value = int(phash, 16)
+        node = [value, payload, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, phash: str, max_distance: int) -> list[tuple[int, object]]:
+        """返回 (距离, payload) 列表，按距离升序"""
+        if self.root is None:
+            return []
+        value = int(phash, 16)
+        results = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                results.append((distance, node[1]))
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        results.sort(key=lambda item: item[0])
+        return results
+
+
+class NearDuplicateIndex:
+    """已识别图片的近重复索引，每个模型版本一棵 BK 树（有界，超出后保留最近一半重建）
+
+    滚动发布或热切换期间多个版本同时在用，各版本互不清空；模型注册表下线版本时调用 retire()。
+    """
+
+    def __init__(self, max_entries: int = 50000, max_distance: int = 6):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._versions: dict[str, tuple[dict, BKTree]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, phash: str, model_version: str):
+        """查找阈值内最近的已识别结果，返回 payload 或 None"""
+        if self.max_distance < 0:
+            return None
+        with self._lock:
+            _, tree = self._versions.get(model_version, (None, None))
+            matches = tree.search(phash, self.max_distance) if tree is not None else []
+            if matches:
+                self.hits += 1
+                return matches[0][1]
+            self.misses += 1
+            return None
+
+    def add(self, phash: str, model_version: str, payload):
+        with self._lock:
+            entries, tree = self._versions.setdefault(model_version, ({}, BKTree()))
+            if phash in entries:
+                return
+            entries[phash] = payload
+            tree.add(phash, payload)
+            if len(entries) > self.max_entries:
+                keep = dict(list(entries.items())[len(entries) // 2:])
+                tree = BKTree()
+                for key, value in keep.items():
+                    tree.add(key, value)
+                self._versions[model_version] = (keep, tree)
+
+    def retire(self, model_version: str):
+        """模型版本下线后丢弃它的索引"""
+        with self._lock:
+            self._versions.pop(model_version, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': sum(len(entries) for entries, _ in self._versions.values()),
+                'modelVersions': sorted(self._versions),
+                'maxDistance': self.max_distance,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+
+def cluster(items: list[tuple[str, object]], max_distance: int) -> list[list[object]]:
+    """把 (phash, payload) 按汉明距离阈值连通聚类，只返回包含 2 个以上成员的簇"""
+    tree = BKTree()
+    for index, (phash, _) in enumerate(items):
+        tree.add(phash, index)
+
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for index, (phash, _) in enumerate(items):
+        for _, other in tree.search(phash, max_distance):
+            a, b = find(index), find(other)
+            if a != b:
+                parent[b] = a
+
+    groups = {}
+    for index, (_, payload) in enumerate(items):
+        groups.setdefault(find(index), []).append(payload)
+    clusters = [group for group in groups.values() if len(group) > 1]
+    clusters.sort(key=len, reverse=True)
+    return clusters
+
+
+_index: NearDuplicateIndex | None = None
+
+
+def init_near_duplicate_index(app):
+    global _index
+    _index = NearDuplicateIndex(
+        max_entries=app.config.get('PHASH_INDEX_SIZE', 50000),
+        max_distance=app.config.get('PHASH_MAX_DISTANCE', 6),
+    )
+    return _index
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    global _index
+    if _index is None:
+        _index = NearDuplicateIndex()
+    return _index
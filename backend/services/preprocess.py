@@ -0,0 +1,86 @@
+"""
+识别图片预处理流水线
+
+每张上传图片只解码一次：按 EXIF 方向校正，缩小到展示尺寸（JPEG 利用 draft
+直接按比例解码），再由同一份像素生成模型输入张量和感知哈希。
+只有缩小后的展示图会被保存，原始的 8–12MP 照片不落盘。
+"""
+
+import io
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from services.phash import dhash_image
+
+DEFAULT_DISPLAY_SIZE = 1024
+DISPLAY_JPEG_QUALITY = 85
+
+
+@dataclass
+class PreprocessedImage:
+    tensor: np.ndarray  # (3, S, S) float32，C 连续
+    phash: str
+    display: Image.Image  # EXIF 校正并缩小后的 RGB 图
+    original_size: tuple[int, int]
+
+    def display_jpeg(self, quality: int = DISPLAY_JPEG_QUALITY) -> bytes:
+        buf = io.BytesIO()
+        self.display.save(buf, 'JPEG', quality=quality, optimize=True)
+        return buf.getvalue()
+
+
+def open_image(source: bytes | str) -> Image.Image:
+    """从字节或文件路径打开图片（惰性解码）"""
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+class ImagePreprocessor:
+    def __init__(self, input_size: int, mean, std, display_size: int = DEFAULT_DISPLAY_SIZE):
+        self.input_size = input_size
+        self.display_size = max(display_size, input_size)
+        self._mean = np.asarray(mean, dtype=np.float32).reshape(3, 1, 1)
+        self._std = np.asarray(std, dtype=np.float32).reshape(3, 1, 1)
+        # 预先合并归一化系数：x / 255 / std - mean / std
+        self._scale = (1.0 / (255.0 * self._std)).astype(np.float32)
+        self._offset = (-self._mean / self._std).astype(np.float32)
+
+    def decode(self, source: bytes | str) -> tuple[Image.Image, tuple[int, int]]:
+        """解码并校正方向，返回不超过展示尺寸的 RGB 图和原始尺寸"""
+        with open_image(source) as img:
+            original_size = img.size
+            # JPEG 按 1/2、1/4、1/8 比例直接解码，避免完整解码大图
+            img.draft('RGB', (self.display_size, self.display_size))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert('RGB')
+        if max(img.size) > self.display_size:
+            img.thumbnail((self.display_size, self.display_size), Image.BILINEAR)
+        return img, original_size
+
+    def decode_full(self, source: bytes | str) -> Image.Image:
+        """按原始分辨率解码并校正方向（分块识别在原图上切块）"""
+        with open_image(source) as img:
+            return ImageOps.exif_transpose(img).convert('RGB')
+
+    def to_tensor(self, image: Image.Image) -> np.ndarray:
+        """缩放到模型输入尺寸并归一化为 (3, S, S) float32 张量"""
+        resized = image.resize((self.input_size, self.input_size), Image.BILINEAR)
+        chw = np.asarray(resized, dtype=np.float32).transpose(2, 0, 1)
+        return np.ascontiguousarray(chw * self._scale + self._offset)
+
+    def crops_to_tensor(self, image: Image.Image, boxes) -> np.ndarray:
+        """把多个区域 (left, top, right, bottom) 各自缩放到输入尺寸，整体归一化为 (N, 3, S, S)"""
+        size = (self.input_size, self.input_size)
+        crops = np.stack([np.asarray(image.resize(size, Image.BILINEAR, box=box)) for box in boxes])
+        nchw = crops.astype(np.float32).transpose(0, 3, 1, 2)
+        return np.ascontiguousarray(nchw * self._scale + self._offset)
+
+    def run(self, source: bytes | str) -> PreprocessedImage:
+        display, original_size = self.decode(source)
+        return PreprocessedImage(
+            tensor=self.to_tensor(display),
+            phash=dhash_image(display),
+            display=display,
+            original_size=original_size,
+        )
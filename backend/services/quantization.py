@@ -0,0 +1,87 @@
+"""
+int8 量化 — 用已保存的上传图片校准，生成 *.int8.* 模型，并与浮点模型对比精度和速度
+
+仅支持 onnx：onnxruntime.quantization 静态量化（QDQ 格式、权重按通道），由 ORT 的整数算子执行。
+"""
+
+import os
+import random
+import time
+
+import numpy as np
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+
+
+def sample_calibration_images(root: str, count: int, seed: int = 0) -> list[str]:
+    """从上传目录随机抽取图片路径（跳过暂存目录）"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(dirpath, filename))
+    if len(paths) > count:
+        paths = random.Random(seed).sample(paths, count)
+    return paths
+
+
+def quantize_onnx(src: str, dst: str, tensors: np.ndarray):
+    try:
+        import onnxruntime as ort
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    except ImportError as exc:
+        raise RuntimeError('onnxruntime is not installed') from exc
+
+    input_name = ort.InferenceSession(src, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._batches = iter({input_name: tensor[None]} for tensor in tensors)
+
+        def get_next(self):
+            return next(self._batches, None)
+
+    quantize_static(src, dst, Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+
+
+QUANTIZERS = {
+    'onnx': quantize_onnx,
+}
+
+
+def throughput(engine, tensors: np.ndarray, batch_size: int, min_seconds: float = 1.0) -> float:
+    """重复对评估集做批量前向计算，返回每秒图片数"""
+    engine.predict_batch(tensors[:batch_size])
+    images = 0
+    started = time.perf_counter()
+    while True:
+        for i in range(0, len(tensors), batch_size):
+            engine.predict_batch(tensors[i:i + batch_size])
+        images += len(tensors)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return images / elapsed
+
+
+def compare(fp32, int8, tensors: np.ndarray, batch_size: int) -> dict:
+    """int8 相对浮点模型的 top-1 一致率、置信度偏差和吞吐量"""
+    reference, quantized = [], []
+    for i in range(0, len(tensors), batch_size):
+        reference.extend(fp32.predict_batch(tensors[i:i + batch_size]))
+        quantized.extend(int8.predict_batch(tensors[i:i + batch_size]))
+    agreed = sum(a.disease_name == b.disease_name for a, b in zip(reference, quantized))
+    prob_delta = np.abs(np.stack([a.probabilities for a in reference]) -
+                        np.stack([b.probabilities for b in quantized]))
+    fp32_rate = throughput(fp32, tensors, batch_size)
+    int8_rate = throughput(int8, tensors, batch_size)
+    return {
+        'images': len(tensors),
+        'top1Agreement': round(agreed / len(tensors), 4) if len(tensors) else 0,
+        'meanAbsProbabilityDelta': round(float(prob_delta.mean()), 6),
+        'maxAbsProbabilityDelta': round(float(prob_delta.max()), 6),
+        'fp32ImagesPerSec': round(fp32_rate, 1),
+        'int8ImagesPerSec': round(int8_rate, 1),
+        'speedup': round(int8_rate / fp32_rate, 3) if fp32_rate else 0,
+    }
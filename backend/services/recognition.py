@@ -0,0 +1,166 @@
+"""
+识别结果持久化 — 同步接口和异步任务共用
+"""
+
+import json
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from models import db, History, RecognitionDetail
+from services.inference import Prediction
+from services.knowledge import get_knowledge_store
+from services.phash import get_near_duplicate_index
+from services.result_cache import content_hash, get_result_cache
+from services.stats_rollup import record_history
+from services.user_stats import count_histories
+
+
+def lookup_prediction(engine, source: bytes | str, digest: str | None = None):
+    """依次按内容哈希、感知哈希查找可复用的识别结果
+
+    source 为图片字节或文件路径；digest 已知时（例如上传存储已计算）不再重复哈希。
+    内容哈希命中时不解码图片；否则运行一次预处理流水线，得到的张量可直接用于推理。
+    返回 (digest, prepared, prediction)：prepared 为 PreprocessedImage 或 None，
+    未命中时 prediction 为 None。图片无法解码时抛出 OSError。
+    """
+    cache = get_result_cache()
+    digest = digest or content_hash(source)
+    prediction = cache.get(digest, engine.model_version)
+    if prediction is not None:
+        prediction.model_version = engine.model_version
+        return digest, None, prediction
+
+    prepared = engine.preprocessor.run(source)
+    near = get_near_duplicate_index().lookup(prepared.phash, engine.model_version)
+    if near is not None:
+        prediction = Prediction(disease_name=near.disease_name, confidence=near.confidence,
+                                phash=prepared.phash, model_version=engine.model_version,
+                                candidates=near.candidates)
+        cache.put(digest, engine.model_version, prediction)
+    return digest, prepared, prediction
+
+
+def remember_prediction(engine, digest: str, phash: str | None, prediction):
+    """把新推理的结果写入内容哈希缓存和近重复索引"""
+    prediction.phash = phash
+    get_result_cache().put(digest, engine.model_version, prediction)
+    if phash:
+        get_near_duplicate_index().add(phash, engine.model_version, prediction)
+
+
+def seed_near_duplicates(model_version: str, limit: int) -> int:
+    """用该模型版本最近的 limit 条识别记录填充近重复索引，返回写入的条目数
+
+    worker 重启后不必从空索引开始积累；同一感知哈希有多条记录时保留最新的结果。
+    """
+    index = get_near_duplicate_index()
+    if index.max_distance < 0 or limit <= 0:
+        return 0
+    rows = db.session.execute(
+        select(RecognitionDetail.phash, RecognitionDetail.disease_name, RecognitionDetail.confidence,
+               RecognitionDetail.top_k)
+        .where(RecognitionDetail.model_version == model_version, RecognitionDetail.phash.isnot(None))
+        .order_by(RecognitionDetail.created_at.desc())
+        .limit(limit)
+    ).all()
+    latest = {}
+    for phash, disease_name, confidence, top_k in rows:
+        latest.setdefault(phash, Prediction(
+            disease_name=disease_name, confidence=float(confidence), phash=phash,
+            model_version=model_version, candidates=json.loads(top_k) if top_k else None,
+        ))
+    # 从旧到新写入，索引超出上限时淘汰的是较早的记录
+    for phash, prediction in reversed(latest.items()):
+        index.add(phash, model_version, prediction)
+    return len(latest)
+
+
+def candidates_of(prediction) -> list[dict]:
+    """预测的候选列表；旧缓存条目没有候选时退化为只有第一名"""
+    return prediction.candidates or [{'diseaseName': prediction.disease_name, 'confidence': prediction.confidence}]
+
+
+def with_knowledge(candidates: list[dict], k: int) -> list[dict]:
+    """取前 k 个候选，并把模型标签按名称或别名精确关联到知识库条目（未收录时 pestId/knowledge 为 None）
+
+    不做模糊匹配：差一个字的标签往往是另一种病害，关联错了会给出错误的防治建议。
+    """
+    store = get_knowledge_store()
+    results = []
+    for c in candidates[:max(1, k)]:
+        item, _ = store.resolve(c['diseaseName'], fuzzy=False)
+        results.append(dict(c, pestId=item['id'] if item else None, knowledge=item))
+    return results
+
+
+def build_records(recog_id: str, user_id: int | None, image_url: str | None, prediction,
+                  created_at: datetime | None = None):
+    """根据预测结果构造 RecognitionDetail 和 History 记录（created_at 默认为当前时间）"""
+    # 显式写入 created_at，识别量汇总与记录使用同一时间戳
+    now = created_at or datetime.now(timezone.utc)
+    rd = RecognitionDetail(
+        id=recog_id,
+        user_id=user_id,
+        disease_name=prediction.disease_name,
+        confidence=prediction.confidence,
+        description='Auto-generated recognition result.',
+        cause='',
+        solution_title='Suggested measures',
+        solution_steps=json.dumps(['Observe field', 'Consult expert']),
+        image_url=image_url or '',
+        phash=prediction.phash,
+        model_version=prediction.model_version,
+        hotspots=json.dumps(prediction.hotspots) if prediction.hotspots else None,
+        top_k=json.dumps(prediction.candidates, ensure_ascii=False) if prediction.candidates else None,
+        created_at=now
+    )
+
+    hist = History(
+        id=uuid.uuid4().hex[:32],
+        user_id=user_id,
+        date=now.date(),
+        image_url=image_url or '',
+        disease_name=prediction.disease_name,
+        confidence=prediction.confidence,
+        created_at=now
+    )
+    return rd, hist
+
+
+def save_recognitions(user, items):
+    """批量写入识别详情和历史记录，计入识别量汇总和用户识别计数（调用方负责 commit）
+
+    items 为 (recog_id, image_url, prediction) 列表。
+    """
+    user_id = user.id if user else None
+    records = []
+    for recog_id, image_url, prediction in items:
+        records.extend(build_records(recog_id, user_id, image_url, prediction))
+    db.session.add_all(records)
+    histories = [record for record in records if isinstance(record, History)]
+    record_history(histories)
+    count_histories(histories)
+
+    if user and items:
+        user.last_login = datetime.now(timezone.utc)
+    return records
+
+
+def save_rescored(user_id: int | None, items):
+    """写入离线重新打分（bulk_recognize.py）的识别详情和历史记录（调用方负责 commit）
+
+    items 为 (recog_id, image_url, prediction, captured_at) 列表，记录日期取图片的原始时间。
+    重新打分不是新的识别，不计入识别量汇总和用户识别计数，也不更新 last_login。
+    """
+    records = []
+    for recog_id, image_url, prediction, captured_at in items:
+        records.extend(build_records(recog_id, user_id, image_url, prediction, captured_at))
+    db.session.add_all(records)
+    return records
+
+
+def save_recognition(recog_id: str, user, image_url: str | None, prediction):
+    """写入单条识别详情和历史记录，并更新用户识别计数（调用方负责 commit）"""
+    return save_recognitions(user, [(recog_id, image_url, prediction)])
@@ -0,0 +1,144 @@
+"""
+识别结果缓存 — 按图片内容哈希 + 模型版本缓存预测结果
+
+重复上传同一张图片时跳过预处理和推理，只写入新的 History 记录。
+内存层为有界 LRU，条目按 (模型版本, 内容哈希) 存放；可选的磁盘层（RESULT_CACHE_DIR）
+由同一台机器上的所有 gunicorn worker 和任务进程共享，按版本分目录。
+滚动发布或热切换期间不同 worker / 仍在旧引擎上的请求会同时读写多个版本，互不影响；
+模型注册表下线某个版本时才调用 retire() 清理该版本的内存条目和磁盘目录。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from services.inference import Prediction
+
+
+def content_hash(source: bytes | str) -> str:
+    """计算字节或文件内容的 SHA-256"""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024, disk_dir: str | None = None):
+        self.max_entries = max(0, max_entries)
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _disk_path(self, digest: str, model_version: str) -> str:
+        return os.path.join(self.disk_dir, model_version, digest[:2], f'{digest}.json')
+
+    def retire(self, model_version: str):
+        """模型版本下线后清理它的内存条目和磁盘目录"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == model_version]:
+                del self._entries[key]
+            self.invalidations += 1
+        if self.disk_dir and model_version and os.sep not in model_version and not model_version.startswith('.'):
+            shutil.rmtree(os.path.join(self.disk_dir, model_version), ignore_errors=True)
+
+    def _remember(self, key: tuple[str, str], value: dict):
+        """写入内存层并按 LRU 淘汰（需持有锁）"""
+        if not self.max_entries:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, digest: str, model_version: str) -> Prediction | None:
+        key = (model_version, digest)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return Prediction(**value)
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(digest, model_version), encoding='utf-8') as fh:
+                    value = json.load(fh)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, value)
+                return Prediction(**value)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, digest: str, model_version: str, prediction: Prediction):
+        value = {
+            'disease_name': prediction.disease_name,
+            'confidence': prediction.confidence,
+            'phash': prediction.phash,
+            'candidates': prediction.candidates,
+        }
+        with self._lock:
+            self._remember((model_version, digest), value)
+
+        if self.disk_dir:
+            path = self._disk_path(digest, model_version)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子替换，避免其他进程读到半个文件
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(value, fh, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'modelVersions': sorted({version for version, _ in self._entries}),
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'diskTier': bool(self.disk_dir),
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hitRate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0,
+            }
+
+
+_cache: ResultCache | None = None
+
+
+def init_result_cache(app):
+    global _cache
+    _cache = ResultCache(
+        max_entries=app.config.get('RESULT_CACHE_SIZE', 1024),
+        disk_dir=app.config.get('RESULT_CACHE_DIR'),
+    )
+    return _cache
+
+
+def get_result_cache() -> ResultCache:
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
@@ -0,0 +1,102 @@
+"""
+管理后台识别量统计 — 按请求时区分桶的近 N 天、近 N 个自然月和总识别量
+
+桶边界（本地每天/每月开始的时刻）在 Python 中按时区换算成 UTC，夏令时切换日也正确。
+- 时区在 STATS_TIMEZONES 中：读取 history_daily_stats 汇总表（services/stats_rollup.py）
+- 其他时区：日、月各一条 `created_at >= :since` 的范围查询，用 CASE 把记录映射到桶号后 GROUP BY，
+  可以走 created_at 索引，不再对每个桶单独发查询
+"""
+
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import case, func, select
+
+from models import db, History
+from services.stats_rollup import daily_counts, stats_timezones, total_count
+
+UTC = timezone.utc
+
+
+def last_days(today: date, days: int) -> list[date]:
+    return [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+
+
+def last_months(today: date, months: int) -> list[date]:
+    """截至 today 所在月的最近若干个自然月（每月 1 日），按时间顺序"""
+    result = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        result.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return result[::-1]
+
+
+def next_month(month: date) -> date:
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+def utc_start(day: date, tz: ZoneInfo) -> datetime:
+    """本地日期 0 点对应的 UTC 时刻（不带时区信息，与 history.created_at 的存储方式一致）"""
+    return datetime.combine(day, time.min, tz).astimezone(UTC).replace(tzinfo=None)
+
+
+def bucket_counts(boundaries: list[datetime]) -> list[int]:
+    """一次范围扫描统计 [boundaries[i], boundaries[i+1]) 内的记录数，返回 len(boundaries)-1 个计数"""
+    if len(boundaries) < 2:
+        return []
+    bucket = case(
+        *[(History.created_at < end, i) for i, end in enumerate(boundaries[1:])],
+        else_=len(boundaries) - 1,
+    )
+    rows = db.session.execute(
+        select(bucket.label('bucket'), func.count())
+        .where(History.created_at >= boundaries[0], History.created_at < boundaries[-1])
+        .group_by('bucket')
+    )
+    counts = [0] * (len(boundaries) - 1)
+    for index, count in rows:
+        if 0 <= index < len(counts):
+            counts[index] = int(count)
+    return counts
+
+
+def scan_trends(tz_name: str, days: int = 7, months: int = 6, today: date | None = None) -> dict:
+    """直接统计 history：日、月各一次范围查询，总数一次 COUNT"""
+    tz = ZoneInfo(tz_name)
+    today = today or datetime.now(tz).date()
+    day_list = last_days(today, days)
+    month_list = last_months(today, months)
+
+    daily = bucket_counts([utc_start(day, tz) for day in day_list] + [utc_start(today + timedelta(days=1), tz)])
+    monthly = bucket_counts([utc_start(month, tz) for month in month_list] + [utc_start(next_month(month_list[-1]), tz)])
+    return {
+        'total': History.query.count(),
+        'daily': list(zip(day_list, daily)),
+        'monthly': list(zip(month_list, monthly)),
+    }
+
+
+def rollup_trends(tz_name: str, days: int = 7, months: int = 6, today: date | None = None) -> dict:
+    """从汇总表读取（tz_name 须在 STATS_TIMEZONES 中）"""
+    today = today or datetime.now(ZoneInfo(tz_name)).date()
+    day_list = last_days(today, days)
+    month_list = last_months(today, months)
+    per_day = daily_counts(tz_name, min(day_list[0], month_list[0]), next_month(month_list[-1]) - timedelta(days=1))
+
+    per_month = Counter()
+    for day, count in per_day.items():
+        per_month[day.replace(day=1)] += count
+    return {
+        'total': total_count(tz_name),
+        'daily': [(day, per_day.get(day, 0)) for day in day_list],
+        'monthly': [(month, per_month.get(month, 0)) for month in month_list],
+    }
+
+
+def recognition_trends(tz_name: str, days: int = 7, months: int = 6) -> dict:
+    """按时区选择数据源：汇总表维护了该时区时读汇总表，否则扫描 history"""
+    if tz_name in stats_timezones():
+        return rollup_trends(tz_name, days, months)
+    return scan_trends(tz_name, days, months)
@@ -0,0 +1,132 @@
+"""
+管理后台统计（/api/admin/stats）响应的进程内缓存 — 按时区缓存计算好的 payload
+
+- 各 worker 每隔 ADMIN_STATS_VERSION_CHECK_INTERVAL 秒读一次数据指纹（history 最新的 created_at、
+  feedbacks 最大的 id，两者都是索引上的单行查找），指纹变化说明有新的识别记录或反馈，缓存视为过期；
+  写入路径不做任何额外操作，持续有写入时每个时区每个检查间隔最多重算一次
+- 没有写入时缓存最长保留 ADMIN_STATS_CACHE_TTL 秒（删除记录、用户登录、启用状态等变化靠 TTL 刷新）
+- 单飞：同一时区过期后只有一个线程重算，其他请求直接返回旧的 payload；
+  还没有缓存时并发请求等待这一次计算。重算失败时继续返回旧的 payload
+
+多个 worker 各自持有缓存，重算在 worker 内单飞。
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import func, select
+
+from models import db, Feedback, History
+
+
+def data_fingerprint() -> tuple:
+    """最新识别记录的时间和最大反馈 id；有新的识别或反馈写入时变化"""
+    row = db.session.execute(select(
+        select(func.max(History.created_at)).scalar_subquery(),
+        select(func.max(Feedback.id)).scalar_subquery(),
+    )).one()
+    return tuple(row)
+
+
+@dataclass(frozen=True)
+class CachedStats:
+    payload: dict
+    version: tuple | None
+    built_at: float
+
+
+class StatsCache:
+    def __init__(self, ttl: float = 30.0, check_interval: float = 2.0):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries: dict[str, CachedStats] = {}
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _current_version(self) -> tuple | None:
+        """数据指纹的最近读数，每个检查间隔最多读一次数据库（需在 app context 中调用）"""
+        now = time.time()
+        if self._version is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                self._version = data_fingerprint()
+            except Exception:
+                # 数据库暂时不可用时沿用上次读数
+                pass
+        return self._version
+
+    def _fresh(self, entry: CachedStats, version: tuple | None) -> bool:
+        return time.time() - entry.built_at < self.ttl and entry.version == version
+
+    def get(self, key: str, compute) -> tuple[dict, float]:
+        """返回 (payload, 缓存时长秒)；过期时由一个线程调用 compute() 重算"""
+        version = self._current_version()
+        entry = self._entries.get(key)
+        if entry is not None and self._fresh(entry, version):
+            self.hits += 1
+            return entry.payload, time.time() - entry.built_at
+
+        lock = self._key_lock(key)
+        if entry is not None:
+            # 其他线程正在重算时直接返回旧的 payload
+            if not lock.acquire(blocking=False):
+                self.stale_hits += 1
+                return entry.payload, time.time() - entry.built_at
+        else:
+            lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry, version):
+                self.hits += 1
+                return entry.payload, time.time() - entry.built_at
+            try:
+                payload = compute()
+            except Exception:
+                if entry is None:
+                    raise
+                self.stale_hits += 1
+                return entry.payload, time.time() - entry.built_at
+            self._entries[key] = CachedStats(payload, version, time.time())
+            self.refreshes += 1
+            return payload, 0.0
+        finally:
+            lock.release()
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            'fingerprint': [str(value) if value is not None else None for value in self._version or ()],
+            'entries': {key: round(now - entry.built_at, 1) for key, entry in list(self._entries.items())},
+            'hits': self.hits,
+            'staleHits': self.stale_hits,
+            'refreshes': self.refreshes,
+        }
+
+
+_cache = None
+
+
+def init_stats_cache(app):
+    global _cache
+    _cache = StatsCache(
+        ttl=app.config.get('ADMIN_STATS_CACHE_TTL', 30.0),
+        check_interval=app.config.get('ADMIN_STATS_VERSION_CHECK_INTERVAL', 2.0),
+    )
+    return _cache
+
+
+def get_stats_cache() -> StatsCache:
+    global _cache
+    if _cache is None:
+        _cache = StatsCache()
+    return _cache
@@ -0,0 +1,105 @@
+"""
+识别量汇总（history_daily_stats 表）— 管理后台统计不再扫描 history
+
+每条识别记录按 STATS_TIMEZONES 中的每个时区换算成本地日期，在写入识别记录的同一事务内
+把 (时区, 日期, 病害) 计数加一；backfill() 从 history 全量或按日期重建。
+仪表盘的近 7 天、近 6 个月和总识别量由 services/stats.py 从汇总表读取，查询量只与天数和病害数有关。
+"""
+
+from collections import Counter
+from datetime import date, datetime, time, timezone
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, History, HistoryDailyStat
+
+UTC = timezone.utc
+
+
+def stats_timezones() -> list[str]:
+    return current_app.config.get('STATS_TIMEZONES') or ['Asia/Shanghai']
+
+
+def local_day(dt: datetime, tz: ZoneInfo) -> date:
+    """时间戳在指定时区的日期（无时区信息的时间按 UTC 处理）"""
+    aware = dt if dt.tzinfo else dt.replace(tzinfo=UTC)
+    return aware.astimezone(tz).date()
+
+
+def _upsert(rows: list[dict]):
+    """一条 INSERT ... ON DUPLICATE KEY UPDATE 把计数累加到已有行
+
+    不先 UPDATE 再 INSERT：InnoDB 下两个事务对同一不存在的键先后加间隙锁再插入会互相死锁。
+    SQLite（测试和基准脚本）使用等价的 ON CONFLICT DO UPDATE。
+    """
+    if db.session.get_bind().dialect.name == 'mysql':
+        stmt = mysql_insert(HistoryDailyStat).values(rows)
+        stmt = stmt.on_duplicate_key_update(count=HistoryDailyStat.count + stmt.inserted.count)
+    else:
+        stmt = sqlite_insert(HistoryDailyStat).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[HistoryDailyStat.timezone, HistoryDailyStat.day, HistoryDailyStat.disease_name],
+            set_={'count': HistoryDailyStat.count + stmt.excluded.count},
+        )
+    db.session.execute(stmt)
+
+
+def record_history(rows: list[History]):
+    """新写入的 History 记录计入汇总（调用方提交事务）"""
+    counts = Counter()
+    for tz_name in stats_timezones():
+        tz = ZoneInfo(tz_name)
+        for row in rows:
+            counts[(tz_name, local_day(row.created_at, tz), row.disease_name)] += 1
+    if counts:
+        # 按主键顺序写入，多行的批次之间加锁顺序一致
+        _upsert([
+            {'timezone': tz_name, 'day': day, 'disease_name': disease_name, 'count': count}
+            for (tz_name, day, disease_name), count in sorted(counts.items())
+        ])
+
+
+def backfill(tz_name: str, since: date | None = None, batch_size: int = 10000) -> int:
+    """从 history 重建一个时区的汇总（since 为本地日期，只重建该日及之后），返回计入的记录数
+
+    在一个事务内先删后插，调用方提交。
+    """
+    tz = ZoneInfo(tz_name)
+    query = select(History.created_at, History.disease_name).where(History.created_at.isnot(None))
+    clear = delete(HistoryDailyStat).where(HistoryDailyStat.timezone == tz_name)
+    if since is not None:
+        since_utc = datetime.combine(since, time.min, tz).astimezone(UTC).replace(tzinfo=None)
+        query = query.where(History.created_at >= since_utc)
+        clear = clear.where(HistoryDailyStat.day >= since)
+
+    counts = Counter()
+    for created_at, disease_name in db.session.execute(query.execution_options(yield_per=batch_size)):
+        counts[(local_day(created_at, tz), disease_name)] += 1
+
+    db.session.execute(clear)
+    db.session.add_all(
+        HistoryDailyStat(timezone=tz_name, day=day, disease_name=disease_name, count=count)
+        for (day, disease_name), count in counts.items()
+    )
+    return sum(counts.values())
+
+
+def daily_counts(tz_name: str, start: date, end: date) -> dict[date, int]:
+    """[start, end] 内每个本地日期的识别量（没有记录的日期不出现）"""
+    rows = db.session.execute(
+        select(HistoryDailyStat.day, func.sum(HistoryDailyStat.count))
+        .where(HistoryDailyStat.timezone == tz_name, HistoryDailyStat.day.between(start, end))
+        .group_by(HistoryDailyStat.day)
+    )
+    return {day: int(count) for day, count in rows}
+
+
+def total_count(tz_name: str) -> int:
+    total = db.session.execute(
+        select(func.sum(HistoryDailyStat.count)).where(HistoryDailyStat.timezone == tz_name)
+    ).scalar()
+    return int(total or 0)
@@ -0,0 +1,150 @@
+"""
+内容寻址的上传文件存储
+
+请求体按块流式写入临时文件，同时计算 SHA-256，完成后原子重命名到分片目录
+ab/cd/<hash>.<ext>。相同内容只存一份，文件名与客户端无关，URL 稳定不变。
+识别图片只保存派生的展示图 ab/cd/<原图hash>_display.jpg，原图暂存后即删除。
+"""
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 64 * 1024
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp', 'heic'}
+EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+
+@dataclass
+class StoredUpload:
+    digest: str
+    path: str
+    url: str
+    size: int
+    deduplicated: bool
+
+
+@dataclass
+class StagedUpload:
+    """已写入临时文件但尚未放入存储的上传，用完后调用 discard()"""
+    path: str
+    digest: str
+    ext: str
+    size: int
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def normalize_extension(filename: str | None, default: str = 'jpg') -> str:
+    """取客户端文件名的扩展名（白名单内），否则使用默认扩展名"""
+    name = secure_filename(filename or '')
+    ext = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if ext not in ALLOWED_EXTENSIONS:
+        ext = default
+    return EXTENSION_ALIASES.get(ext, ext)
+
+
+class UploadStore:
+    def __init__(self, root: str, url_prefix: str):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        self.tmp_dir = os.path.join(root, '.tmp')
+
+    def resolve(self, url: str | None) -> str | None:
+        """把本存储生成的 URL 映射回磁盘路径；不存在或越界时返回 None"""
+        if not url or not url.startswith(self.url_prefix + '/'):
+            return None
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, url[len(self.url_prefix) + 1:]))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def relative_path(self, digest: str, ext: str, suffix: str = '') -> str:
+        return f'{digest[:2]}/{digest[2:4]}/{digest}{suffix}.{ext}'
+
+    def stage(self, file_storage, default_ext: str = 'jpg') -> StagedUpload:
+        """把上传文件流式写入临时文件并计算哈希，暂不放入存储"""
+        ext = normalize_extension(file_storage.filename, default_ext)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file_storage.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return StagedUpload(path=tmp_path, digest=digest.hexdigest(), ext=ext, size=size)
+
+    def save(self, file_storage, default_ext: str = 'jpg') -> StoredUpload:
+        """流式保存上传文件（werkzeug FileStorage），返回存储信息"""
+        staged = self.stage(file_storage, default_ext)
+        try:
+            return self._commit(staged.path, self.relative_path(staged.digest, staged.ext), staged.digest, staged.size)
+        finally:
+            staged.discard()
+
+    def find_derivative(self, digest: str, suffix: str = '_display', ext: str = 'jpg') -> StoredUpload | None:
+        """查找由原图哈希派生的文件（例如缩小后的展示图）"""
+        relative = self.relative_path(digest, ext, suffix)
+        path = os.path.join(self.root, relative)
+        if not os.path.isfile(path):
+            return None
+        return StoredUpload(digest=digest, path=path, url=f'{self.url_prefix}/{relative}',
+                            size=os.path.getsize(path), deduplicated=True)
+
+    def save_derivative(self, digest: str, data: bytes, suffix: str = '_display', ext: str = 'jpg') -> StoredUpload:
+        """保存由原图派生的文件，路径由原图哈希决定，原图本身不落盘"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(data)
+            return self._commit(tmp_path, self.relative_path(digest, ext, suffix), digest, len(data))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _commit(self, tmp_path: str, relative: str, digest: str, size: int) -> StoredUpload:
+        path = os.path.join(self.root, relative)
+        deduplicated = os.path.exists(path)
+        if not deduplicated:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # mkstemp 创建的文件只有属主可读，静态文件需要对 Web 服务器可读
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        return StoredUpload(
+            digest=digest,
+            path=path,
+            url=f'{self.url_prefix}/{relative}',
+            size=size,
+            deduplicated=deduplicated,
+        )
+
+
+_store: UploadStore | None = None
+
+
+def init_upload_store(app):
+    global _store
+    _store = UploadStore(app.config['UPLOAD_FOLDER'], app.config['UPLOAD_URL_PREFIX'])
+    return _store
+
+
+def get_upload_store() -> UploadStore:
+    if _store is None:
+        raise RuntimeError('Upload store is not initialized')
+    return _store
@@ -0,0 +1,133 @@
+"""
+用户识别数、反馈数计数器（users.recognition_count / users.feedback_count）与管理后台用户列表
+
+写入或删除 History / Feedback 时在同一事务内调用 count_histories() / count_feedbacks()，
+按用户合并后各发一条 `UPDATE users SET x = x + n`，并发写入也不会丢失计数。
+直接改动过表或计数出现偏差时用 reconcile_counters()（reconcile_user_counts.py）按分组计数批量修正。
+用户列表直接读取计数器列，筛选、排序、分页都在数据库中完成，路由层按批读取结果流式输出。
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+
+from models import db, Feedback, History, User
+
+UTC = timezone.utc
+RECENT_DAYS = 30
+
+# 排序参数 -> 列（最后再按 id 排序保证顺序稳定）
+SORT_KEYS = ('id', 'username', 'createdAt', 'lastLogin', 'recognitionCount', 'feedbackCount')
+
+
+def _adjust(column, rows, sign: int):
+    per_user = Counter(row.user_id for row in rows if row.user_id is not None)
+    for user_id, count in sorted(per_user.items()):
+        db.session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values({column: func.coalesce(column, 0) + sign * count})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def count_histories(rows: list[History], sign: int = 1):
+    """新写入（sign=1）或删除（sign=-1）的识别记录计入用户 recognition_count（调用方提交事务）"""
+    _adjust(User.recognition_count, rows, sign)
+
+
+def count_feedbacks(rows: list[Feedback], sign: int = 1):
+    """新写入（sign=1）或删除（sign=-1）的反馈计入用户 feedback_count（调用方提交事务）"""
+    _adjust(User.feedback_count, rows, sign)
+
+
+def _grouped_counts(model, first_id: int, last_id: int):
+    return (
+        select(model.user_id.label('user_id'), func.count().label('n'))
+        .where(model.user_id.between(first_id, last_id))
+        .group_by(model.user_id)
+        .subquery()
+    )
+
+
+def reconcile_counters(batch_size: int = 5000, dry_run: bool = False) -> int:
+    """按 history / feedbacks 的分组计数修正计数器，返回计数有偏差的用户数
+
+    按 id 分批：每批只对该 id 区间的记录分组计数，一条查询找出偏差、一条批量 UPDATE 修正；调用方提交事务。
+    """
+    drifted = 0
+    last_id = 0
+    while True:
+        ids = db.session.execute(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return drifted
+        histories = _grouped_counts(History, ids[0], ids[-1])
+        feedbacks = _grouped_counts(Feedback, ids[0], ids[-1])
+        actual_recognitions = func.coalesce(histories.c.n, 0)
+        actual_feedbacks = func.coalesce(feedbacks.c.n, 0)
+        rows = db.session.execute(
+            select(User.id, actual_recognitions, actual_feedbacks)
+            .outerjoin(histories, histories.c.user_id == User.id)
+            .outerjoin(feedbacks, feedbacks.c.user_id == User.id)
+            .where(
+                User.id.between(ids[0], ids[-1]),
+                (func.coalesce(User.recognition_count, 0) != actual_recognitions)
+                | (func.coalesce(User.feedback_count, 0) != actual_feedbacks),
+            )
+        ).all()
+        last_id = ids[-1]
+        drifted += len(rows)
+        if rows and not dry_run:
+            db.session.execute(update(User), [
+                {'id': user_id, 'recognition_count': recognitions, 'feedback_count': feedback_count}
+                for user_id, recognitions, feedback_count in rows
+            ])
+
+
+def user_filters(role: str | None = None, active: bool | None = None,
+                 recently_active: bool | None = None, keyword: str | None = None) -> list:
+    """按角色、启用状态、近 30 天是否登录和用户名/邮箱关键字筛选的条件"""
+    conditions = []
+    if role:
+        conditions.append(User.role == role)
+    if active is not None:
+        # is_active 为 NULL 的旧数据按启用处理，与 serialize_basic_user 一致
+        conditions.append(func.coalesce(User.is_active, True) == active)
+    if recently_active is not None:
+        since = datetime.now(UTC) - timedelta(days=RECENT_DAYS)
+        recent = User.last_login >= since
+        conditions.append(recent if recently_active else (User.last_login.is_(None) | ~recent))
+    if keyword:
+        pattern = f'%{keyword}%'
+        conditions.append(User.username.like(pattern) | User.email.like(pattern))
+    return conditions
+
+
+def user_list_query(conditions: list, sort: str = 'id', descending: bool = False):
+    """读取计数器列的用户列表查询，返回的行可以直接交给 serialize_basic_user"""
+    recognition_count = func.coalesce(User.recognition_count, 0).label('recognition_count')
+    feedback_count = func.coalesce(User.feedback_count, 0).label('feedback_count')
+    columns = {
+        'id': User.id,
+        'username': User.username,
+        'createdAt': User.created_at,
+        'lastLogin': User.last_login,
+        'recognitionCount': User.recognition_count,
+        'feedbackCount': User.feedback_count,
+    }
+    order = [columns[sort], User.id] if sort != 'id' else [User.id]
+    return (
+        select(
+            User.id, User.username, User.email, User.role, User.is_active, User.created_at, User.last_login,
+            recognition_count, feedback_count,
+        )
+        .where(*conditions)
+        .order_by(*[column.desc() if descending else column.asc() for column in order])
+    )
+
+
+def count_users(conditions: list) -> int:
+    return db.session.execute(select(func.count()).select_from(User).where(*conditions)).scalar()
@@ -0,0 +1,186 @@
+"""
+Worker 启动预热与就绪状态
+
+每个 gunicorn worker 启动后（gunicorn.conf.py 的 post_worker_init 钩子）依次执行：加载模型、预热推理、
+预先建立数据库连接池、预热知识库查询、从最近的识别记录填充近重复索引，并记录每一步的耗时。
+全部必需步骤成功后 /api/ready 才返回就绪，负载均衡据此决定是否把流量发给该 worker；/api/health 仍只表示进程存活。
+其他方式启动时首次就绪探针会触发预热。
+"""
+
+import io
+import threading
+import time
+
+import numpy as np
+
+# 以模块导入时间近似 worker 启动时间
+PROCESS_STARTED_AT = time.time()
+
+
+class Readiness:
+    """记录预热步骤的结果和耗时"""
+
+    def __init__(self, started_at: float = PROCESS_STARTED_AT):
+        self.started_at = started_at
+        self.ready_at = None
+        self.last_attempt = None
+        self.steps = {}
+        self._lock = threading.Lock()
+
+    def run_step(self, name: str, fn, required: bool = True):
+        started = time.perf_counter()
+        step = {'name': name, 'required': required}
+        try:
+            detail = fn()
+            step['ok'] = True
+            if detail is not None:
+                step['detail'] = detail
+        except Exception as exc:
+            step['ok'] = False
+            # 只保留首行，避免把 SQL 语句等细节暴露给探针
+            step['error'] = (str(exc).splitlines() or [type(exc).__name__])[0]
+        step['durationMs'] = round((time.perf_counter() - started) * 1000, 3)
+        with self._lock:
+            self.steps[name] = step
+        return step
+
+    def is_ok(self, name: str) -> bool:
+        step = self.steps.get(name)
+        return bool(step and step['ok'])
+
+    def finish(self):
+        with self._lock:
+            self.last_attempt = time.time()
+            if all(step['ok'] for step in self.steps.values() if step['required']):
+                self.ready_at = self.last_attempt
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def status(self) -> dict:
+        with self._lock:
+            steps = [dict(step) for step in self.steps.values()]
+        return {
+            'ready': self.ready,
+            'timeToReadyMs': round((self.ready_at - self.started_at) * 1000, 3) if self.ready else None,
+            'uptimeSeconds': round(time.time() - self.started_at, 3),
+            'steps': steps,
+        }
+
+
+def _load_model(app):
+    from services.inference import get_engine
+    from services.model_registry import init_model_registry
+
+    init_model_registry(app)
+    engine = get_engine()
+    return {'backend': engine.backend.name, 'version': engine.model_version, 'precision': engine.precision}
+
+
+def _warm_inference(app):
+    """用合成图片跑一遍预处理，并按单张和满批各做几次前向计算"""
+    from PIL import Image
+
+    from services.batching import get_scheduler
+    from services.inference import get_engine
+
+    engine = get_engine()
+    iterations = max(0, app.config.get('WARMUP_ITERATIONS', 2))
+    buf = io.BytesIO()
+    Image.new('RGB', (engine.input_size * 2, engine.input_size * 2), (90, 140, 60)).save(buf, 'JPEG')
+    prepared = engine.preprocessor.run(buf.getvalue())
+    sizes = sorted({1, max(1, app.config.get('BATCH_MAX_SIZE', 8))})
+    for size in sizes:
+        batch = np.repeat(prepared.tensor[None], size, axis=0)
+        for _ in range(iterations):
+            engine.predict_batch(batch)
+    get_scheduler().start()
+    return {'batchSizes': sizes, 'iterations': iterations}
+
+
+def _warm_db_pool(app):
+    """同时借出多个连接，让连接池在首个请求之前完成建连"""
+    from sqlalchemy import text
+
+    from models import db
+
+    count = max(1, app.config.get('WARMUP_DB_CONNECTIONS', 4))
+    with app.app_context():
+        connections = []
+        try:
+            for _ in range(count):
+                conn = db.engine.connect()
+                connections.append(conn)
+                conn.execute(text('SELECT 1'))
+        finally:
+            for conn in connections:
+                conn.close()
+    return {'connections': count}
+
+
+def _warm_knowledge(app):
+    from services.knowledge import get_knowledge_store
+
+    with app.app_context():
+        snapshot = get_knowledge_store().rebuild()
+        return {'items': len(snapshot.items), 'version': snapshot.version}
+
+
+def _seed_near_duplicates(app):
+    """从 recognition_details 的感知哈希填充当前模型版本的近重复索引（最多 PHASH_INDEX_SIZE 条）"""
+    from services.inference import get_engine
+    from services.recognition import seed_near_duplicates
+
+    version = get_engine().model_version
+    with app.app_context():
+        entries = seed_near_duplicates(version, app.config.get('PHASH_INDEX_SIZE', 50000))
+    return {'entries': entries, 'version': version}
+
+
+WARMUP_STEPS = [
+    ('loadModel', _load_model, ()),
+    ('warmupInference', _warm_inference, ('loadModel',)),
+    ('dbPool', _warm_db_pool, ()),
+    ('knowledge', _warm_knowledge, ()),
+    ('nearDuplicates', _seed_near_duplicates, ('loadModel', 'dbPool')),
+]
+
+_readiness = Readiness()
+_warmup_lock = threading.Lock()
+
+
+def warmup(app) -> Readiness:
+    """执行尚未成功的预热步骤；失败的步骤会被记录，worker 保持未就绪
+
+    依赖的步骤失败时跳过后续步骤。可重复调用：已成功的步骤不会重跑。
+    """
+    with _warmup_lock:
+        for name, fn, depends in WARMUP_STEPS:
+            if _readiness.is_ok(name) or not all(_readiness.is_ok(dep) for dep in depends):
+                continue
+            _readiness.run_step(name, lambda: fn(app))
+        _readiness.finish()
+    if _readiness.ready:
+        app.logger.info('Worker ready in %.0f ms', _readiness.status()['timeToReadyMs'])
+    else:
+        failed = [step['name'] for step in _readiness.steps.values() if not step['ok']]
+        app.logger.warning('Worker not ready, failed warmup steps: %s', failed)
+    return _readiness
+
+
+def check_ready(app) -> Readiness:
+    """就绪探针调用：未就绪时按 WARMUP_RETRY_INTERVAL 节流重试失败的步骤
+
+    例如 worker 启动时数据库尚不可用，恢复后无需重启即可变为就绪。
+    """
+    if not _readiness.ready:
+        interval = app.config.get('WARMUP_RETRY_INTERVAL', 5.0)
+        last = _readiness.last_attempt
+        if last is None or time.time() - last >= interval:
+            warmup(app)
+    return _readiness
+
+
+def get_readiness() -> Readiness:
+    return _readiness
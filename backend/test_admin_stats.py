@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+测试管理后台识别量统计：分组查询 / 汇总表与逐桶查询的结果一致
+
+使用内存 SQLite，不需要启动后端服务：
+    python test_admin_stats.py
+    python -m pytest test_admin_stats.py
+"""
+
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from flask import Flask
+from sqlalchemy import event, extract, func
+
+from models import db, History
+from services.stats import last_days, last_months, rollup_trends, scan_trends
+from services.stats_rollup import backfill
+
+UTC = timezone.utc
+TODAY = date(2024, 11, 5)   # 覆盖 3 月和 11 月的夏令时切换
+TIMEZONES = ['UTC', 'Asia/Shanghai', 'America/New_York']
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        STATS_TIMEZONES=TIMEZONES,
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        rng = random.Random(0)
+        end = datetime(2024, 11, 6, tzinfo=UTC)
+        for i in range(3000):
+            created_at = end - timedelta(seconds=rng.randrange(240 * 86400))
+            db.session.add(History(
+                id=f'h{i:05d}', date=created_at.date(), disease_name=rng.choice(['稻瘟病', '纹枯病', '稻曲病']),
+                confidence=90, created_at=created_at.replace(tzinfo=None),
+            ))
+        db.session.commit()
+    return app
+
+
+def legacy_trends(today: date) -> dict:
+    """改造前 get_stats 的写法：每天、每月各一条 COUNT（按 UTC 日期 / 年月）
+
+    循环照抄原实现，只把 datetime.now(UTC) 换成固定的 today；月份按 30 天步进取年月。
+    """
+    now = datetime.combine(today, datetime.min.time(), UTC)
+    daily = []
+    for i in range(6, -1, -1):
+        day = (now - timedelta(days=i)).date()
+        daily.append((day, History.query.filter(func.date(History.created_at) == day).count()))
+    monthly = []
+    for i in range(5, -1, -1):
+        target_date = now - timedelta(days=i*30)
+        monthly.append((target_date.date().replace(day=1), History.query.filter(
+            extract('year', History.created_at) == target_date.year,
+            extract('month', History.created_at) == target_date.month
+        ).count()))
+    return {'total': History.query.count(), 'daily': daily, 'monthly': monthly}
+
+
+def python_trends(tz_name: str, today: date) -> dict:
+    """逐条换算到本地时间后计数，作为参照"""
+    tz = ZoneInfo(tz_name)
+    days, months = Counter(), Counter()
+    rows = History.query.all()
+    for row in rows:
+        local = row.created_at.replace(tzinfo=UTC).astimezone(tz).date()
+        days[local] += 1
+        months[local.replace(day=1)] += 1
+    return {
+        'total': len(rows),
+        'daily': [(day, days[day]) for day in last_days(today, 7)],
+        'monthly': [(month, months[month]) for month in last_months(today, 6)],
+    }
+
+
+def count_statements(fn, *args, **kwargs):
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_execute)
+    try:
+        return fn(*args, **kwargs), len(statements)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_execute)
+
+
+app = create_app()
+
+
+def test_scan_matches_legacy_in_utc():
+    with app.app_context():
+        assert scan_trends('UTC', today=TODAY) == legacy_trends(TODAY)
+
+
+def test_months_are_calendar_months():
+    """有意的行为变化：旧写法按 30 天步进，月末会重复或跳过月份，现在取连续的 6 个自然月"""
+    with app.app_context():
+        march_end = date(2024, 3, 31)
+        legacy_months = [month for month, _ in legacy_trends(march_end)['monthly']]
+        assert legacy_months == [date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 1, 1),
+                                 date(2024, 3, 1), date(2024, 3, 1)]
+        assert last_months(march_end, 6) == [date(2023, 10, 1), date(2023, 11, 1), date(2023, 12, 1),
+                                             date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)]
+
+
+def test_scan_matches_local_bucketing():
+    with app.app_context():
+        for tz_name in TIMEZONES:
+            assert scan_trends(tz_name, today=TODAY) == python_trends(tz_name, TODAY), tz_name
+
+
+def test_rollup_matches_scan():
+    with app.app_context():
+        for tz_name in TIMEZONES:
+            backfill(tz_name)
+        db.session.commit()
+        for tz_name in TIMEZONES:
+            assert rollup_trends(tz_name, today=TODAY) == scan_trends(tz_name, today=TODAY), tz_name
+
+
+def test_scan_round_trips():
+    with app.app_context():
+        _, legacy = count_statements(legacy_trends, TODAY)
+        _, scan = count_statements(scan_trends, 'Asia/Shanghai', today=TODAY)
+        assert (legacy, scan) == (14, 3)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
@@ -14,6 +14,7 @@ interface DashboardStats {
   recognitionsPerDay: Array<{ date: string; count: number }>;
   feedbackTypes: Array<{ name: string; value: number }>;
   monthlyData: Array<{ month: string; recognitions: number }>;
+  cacheAge: number;
 }
 
 const COLORS = ['#3b82f6', '#ef4444', '#f59e0b', '#10b981'];
@@ -27,6 +28,7 @@ export function DashboardPanel() {
     recognitionsPerDay: [],
     feedbackTypes: [],
     monthlyData: [],
+    cacheAge: 0,
   });
 
   const [loading, setLoading] = useState(true);
@@ -55,6 +57,7 @@ export function DashboardPanel() {
             recognitionsPerDay: data.recognitionsPerDay || [],
             feedbackTypes: data.feedbackTypes || [],
             monthlyData: data.monthlyData || [],
+            cacheAge: data.cacheAge || 0,
           });
         }
       }
@@ -133,6 +136,9 @@ export function DashboardPanel() {
           </CardContent>
         </Card>
       </div>
+      <p className="text-xs text-muted-foreground text-right">
+        数据更新于 {Math.round(stats.cacheAge)} 秒前
+      </p>
 
       {/* 图表 */}
       <div className="grid gap-4 md:grid-cols-2">
@@ -36,6 +36,8 @@ interface Feedback {
 export function FeedbackManagement() {
   const [feedbacks, setFeedbacks] = useState<Feedback[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedFeedback, setSelectedFeedback] = useState<Feedback | null>(null);
   const [isDialogOpen, setIsDialogOpen] = useState(false);
 
@@ -43,10 +45,14 @@ export function FeedbackManagement() {
     fetchFeedbacks();
   }, []);
 
-  const fetchFeedbacks = async () => {
+  // 后端按游标分页：不传 cursor 时重新加载第一页，传入 nextCursor 时把下一页追加到列表末尾
+  const fetchFeedbacks = async (cursor: string | null = null) => {
     try {
       const token = localStorage.getItem('token');
-      const response = await fetch(API_ENDPOINTS.adminFeedbacks, {
+      const url = cursor
+        ? `${API_ENDPOINTS.adminFeedbacks}?cursor=${encodeURIComponent(cursor)}`
+        : API_ENDPOINTS.adminFeedbacks;
+      const response = await fetch(url, {
         headers: {
           'Authorization': `Bearer ${token}`,
         },
@@ -65,13 +71,17 @@ export function FeedbackManagement() {
             createdAt: item.timestamp || '-',
             updatedAt: item.updatedAt || '-',
           }));
-          setFeedbacks(mapped);
-        } else {
+          setFeedbacks((prev) => (cursor ? [...prev, ...mapped] : mapped));
+          setNextCursor(data.nextCursor || null);
+        } else if (!cursor) {
           setFeedbacks([]);
+          setNextCursor(null);
         }
       }
     } catch (error) {
       console.error('Failed to fetch feedbacks:', error);
+      // 加载更多失败时保留已加载的列表
+      if (cursor) return;
       // 使用模拟数据
       setFeedbacks([
         {
@@ -110,6 +120,13 @@ export function FeedbackManagement() {
     }
   };
 
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    await fetchFeedbacks(nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleViewDetails = (feedback: Feedback) => {
     setSelectedFeedback(feedback);
     setIsDialogOpen(true);
@@ -197,6 +214,13 @@ export function FeedbackManagement() {
               ))}
             </TableBody>
           </Table>
+          {nextCursor && (
+            <div className="mt-4 flex justify-center">
+              <Button variant="outline" onClick={handleLoadMore} disabled={loadingMore}>
+                {loadingMore ? '加载中...' : '加载更多'}
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
 
@@ -4,6 +4,7 @@
 NAME="airicepest_backend"
 DIR=/home/ubuntu/AiRicePest/backend
 WORKERS=2 # 根据服务器核心数调整
+THREADS=4 # 每个 worker 的线程数，识别请求在同一 worker 内合并成批
 VENV_DIR=/home/ubuntu/AiRicePest/backend/myenv_311
 FLASK_APP=app.py
 echo "Starting $NAME as $USER"
@@ -11,8 +12,10 @@ echo "Starting $NAME as $USER"
 # Directly use the Gunicorn executable inside the VENV path
 # This bypasses potential issues with 'source' and 'exec' in systemd
 exec $VENV_DIR/bin/gunicorn app:app \
+  --config $DIR/gunicorn.conf.py \
   --name $NAME \
   --workers $WORKERS \
+  --threads $THREADS \
   --bind 127.0.0.1:4000 \
   --log-level=info \
   --timeout 120 \
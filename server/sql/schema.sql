@@ -12,6 +12,7 @@ CREATE TABLE IF NOT EXISTS users (
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   last_login TIMESTAMP NULL DEFAULT NULL,
   recognition_count INT DEFAULT 0 COMMENT '用户识别次数统计',
+  feedback_count INT DEFAULT 0 COMMENT '用户反馈次数统计',
   is_active BOOLEAN DEFAULT TRUE COMMENT '用户是否活跃',
   INDEX idx_last_login (last_login),
   INDEX idx_recognition_count (recognition_count)
@@ -29,6 +30,8 @@ CREATE TABLE IF NOT EXISTS history (
   INDEX idx_user_id (user_id),
   INDEX idx_date (date),
   INDEX idx_created_at (created_at),
+  INDEX idx_date_id (date, id) COMMENT '游标分页 (date, id)',
+  INDEX idx_user_date_id (user_id, date, id) COMMENT '按用户游标分页 (date, id)',
   FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
 );
 
@@ -43,9 +46,15 @@ CREATE TABLE IF NOT EXISTS recognition_details (
   solution_title VARCHAR(256),
   solution_steps TEXT COMMENT 'JSON字符串',
   image_url VARCHAR(512),
+  phash VARCHAR(16) DEFAULT NULL COMMENT '感知哈希（dHash），用于近重复检测',
+  model_version VARCHAR(64) DEFAULT NULL COMMENT '产生该结果的模型版本',
+  hotspots TEXT COMMENT '分块识别的病斑区域，JSON字符串',
+  top_k TEXT COMMENT '前k个候选病害及置信度，JSON字符串',
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   INDEX idx_user_id (user_id),
   INDEX idx_created_at (created_at),
+  INDEX idx_phash (phash),
+  INDEX idx_model_version (model_version),
   FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
 );
 
@@ -68,7 +77,8 @@ CREATE TABLE IF NOT EXISTS knowledge_base (
   biological_control TEXT,
   chemical_control TEXT,
   INDEX idx_category (category),
-  INDEX idx_disease_name (disease_name)
+  INDEX idx_disease_name (disease_name),
+  INDEX idx_category_pest (category, pest_id) COMMENT '游标分页 (category, pest_id)'
 );
 
 -- 反馈表 - 添加联系方式、反馈类型和更新时间
@@ -87,5 +97,36 @@ CREATE TABLE IF NOT EXISTS feedbacks (
   INDEX idx_status (status),
   INDEX idx_feedback_type (feedback_type),
   INDEX idx_created_at (created_at),
+  INDEX idx_created_id (created_at, id) COMMENT '游标分页 (created_at, id)',
   FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-);
\ No newline at end of file
+);
+
+-- 异步识别任务表 - id 与 recognition_details.id 相同，供客户端轮询状态
+CREATE TABLE IF NOT EXISTS recognition_jobs (
+  id VARCHAR(64) PRIMARY KEY,
+  user_id INT DEFAULT NULL COMMENT '关联用户ID',
+  image_url VARCHAR(512) NOT NULL,
+  status ENUM('pending','running','done','failed') NOT NULL DEFAULT 'pending',
+  error TEXT,
+  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  started_at TIMESTAMP NULL DEFAULT NULL,
+  finished_at TIMESTAMP NULL DEFAULT NULL,
+  INDEX idx_status_created (status, created_at),
+  FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+);
+
+-- 进程内缓存版本表 - 数据变更时递增，各 gunicorn worker 据此重建本地缓存
+CREATE TABLE IF NOT EXISTS cache_versions (
+  name VARCHAR(64) PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- 识别量日汇总表 - 按 (时区, 本地日期, 病害) 计数，写入识别记录时增量维护，backfill_stats.py 可重建
+CREATE TABLE IF NOT EXISTS history_daily_stats (
+  timezone VARCHAR(64) NOT NULL,
+  day DATE NOT NULL,
+  disease_name VARCHAR(128) NOT NULL,
+  count INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (timezone, day, disease_name)
+);